@@ -1,56 +1,363 @@
 import maya.cmds as cmds
 import maya.api.OpenMaya as om
+import maya.utils
+import os
 import time
+import json
+import hashlib
+import functools
+import threading
+import traceback
+import tracemalloc
+from contextlib import contextmanager, nullcontext, ExitStack
+from dataclasses import dataclass
 import numpy as np
+import scipy
 from scipy.spatial import cKDTree
 
+# 每个查询点在一个分块里的工作内存：float32 坐标、查询用的 float64 副本、距离和索引、
+# float32 颜色，以及写入 MColorArray 前 tolist() 产生的 Python 对象
+BYTES_PER_CHUNK_POINT = 12 + 24 + 16 + 12 + 200
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+# 空间索引磁盘缓存，可通过环境变量修改目录和容量上限
+SPATIAL_INDEX_CACHE_DIR = os.environ.get("MAYA_SIMILARITY_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".maya_similarity_cache"))
+SPATIAL_INDEX_CACHE_MAX_MB = float(os.environ.get("MAYA_SIMILARITY_CACHE_MAX_MB", 8192))
+# 每棵 KD-树存成的 .npy 数组
+KD_TREE_ARRAYS = ("nodes", "data", "indices")
+
+# 每顶点距离通道：距离存在网格的额外颜色集（R 分量）里，目标名和尺度存在自定义属性里
+PROXIMITY_DISTANCE_COLOR_SET = 'proximityDistance'
+PROXIMITY_TARGET_ATTRIBUTE = 'proximityTarget'
+PROXIMITY_MAX_DIMENSION_ATTRIBUTE = 'proximityMaxDimension'
+PROXIMITY_MESH_STATE_ATTRIBUTE = 'proximityMeshState'
+
+# 性能追踪：MAYA_SIMILARITY_PROFILE=1 时默认开启，每次运行的 JSON 追踪写到这个目录
+# tracemalloc 会让 Python 层的循环慢好几倍，所以内存峰值单独用 MAYA_SIMILARITY_PROFILE_MEMORY=1 打开
+PROFILE_TRACE_DIR = os.environ.get("MAYA_SIMILARITY_TRACE_DIR", os.path.join(os.path.expanduser("~"), ".maya_similarity_traces"))
+
+class ProfileStage:
+    __slots__ = ("profiler", "name", "path", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._stack.append(self.name)
+        self.path = "/".join(self.profiler._stack)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.profiler._stack.pop()
+        self.profiler.record(self.path, self.start, elapsed)
+        return False
+
+class Profiler:
+    """
+    Stage timers, counters and (with trace_memory) peak Python memory for one run. While disabled, stage()
+    returns a shared no-op context and count()/timed() return straight away, so the hot paths pay one
+    attribute check. trace_memory is off by default because tracemalloc slows the timed code itself.
+    """
+    null_stage = nullcontext()
+
+    def __init__(self, enabled=False, trace_dir=PROFILE_TRACE_DIR, trace_memory=False):
+        self.enabled = enabled
+        self.trace_dir = trace_dir
+        self.trace_memory = trace_memory
+        # 同一时间只有一个 run；其他线程在它进行中开始的 run 并入其中
+        self._run_lock = threading.Lock()
+        self._record_lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self, label=None):
+        self.label = label
+        self.stages = {}
+        self.counters = {}
+        self.events = []
+        self.peak_memory_bytes = None
+        self._run_start = time.perf_counter()
+
+    @contextmanager
+    def inherit_stack(self, stack):
+        """Nest the calling thread's stages under a stack captured on another thread, e.g. a worker's under its run"""
+        saved_stack = self._stack
+        self._local.stack = list(stack)
+        try:
+            yield
+        finally:
+            self._local.stack = saved_stack
+
+    @property
+    def _stack(self):
+        # 后台线程和主线程各自维护阶段嵌套
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def stage(self, name):
+        if not self.enabled:
+            return self.null_stage
+        return ProfileStage(self, name)
+
+    def timed(self, name=None):
+        def decorator(func):
+            stage_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with ProfileStage(self, stage_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self._record_lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, path, start, elapsed):
+        with self._record_lock:
+            calls, total = self.stages.get(path, (0, 0.0))
+            self.stages[path] = (calls + 1, total + elapsed)
+            self.events.append({"stage": path, "start": start - self._run_start, "duration": elapsed})
+
+    @contextmanager
+    def run(self, label):
+        """
+        Profile everything inside as one run, then print a summary and dump a JSON trace.
+        A run started while another is active (on any thread) nests into the active one.
+        """
+        if not self.enabled:
+            yield self
+            return
+        if not self._run_lock.acquire(blocking=False):
+            with ProfileStage(self, label):
+                yield self
+            return
+
+        self.reset(label)
+        trace_memory = self.trace_memory
+        start_tracing = trace_memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        try:
+            with ProfileStage(self, label):
+                yield self
+        finally:
+            if trace_memory:
+                self.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+            if start_tracing:
+                tracemalloc.stop()
+            try:
+                self.print_summary()
+                self.dump_trace()
+            finally:
+                self._run_lock.release()
+
+    def to_dict(self):
+        with self._record_lock:
+            return {
+                "label": self.label,
+                "stages": {path: {"calls": calls, "seconds": total} for path, (calls, total) in self.stages.items()},
+                "counters": dict(self.counters),
+                "peak_memory_bytes": self.peak_memory_bytes,
+                "events": list(self.events),
+            }
+
+    def print_summary(self):
+        with self._record_lock:
+            stages, counters = dict(self.stages), dict(self.counters)
+        print(f"\n################### Profile: {self.label} ###################")
+        for path, (calls, total) in sorted(stages.items(), key=lambda item: -item[1][1]):
+            print(f"{total:10.5f} s  {calls:6d} calls  {path}")
+        for name, value in sorted(counters.items()):
+            print(f"{name}: {value}")
+        if self.peak_memory_bytes is None:
+            print("Peak Python memory: not traced (enable trace_memory)")
+        else:
+            print(f"Peak Python memory: {self.peak_memory_bytes / (1024 * 1024):.1f} MB")
+        print(f"################### Profile: {self.label} ###################\n")
+
+    def dump_trace(self, file_path=None):
+        if file_path is None:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            file_path = os.path.join(self.trace_dir, f"{self.label}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        with open(file_path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+        print(f"Profile trace written to {file_path}")
+        return file_path
+
+profiler = Profiler(os.environ.get("MAYA_SIMILARITY_PROFILE") == "1",
+                    trace_memory=os.environ.get("MAYA_SIMILARITY_PROFILE_MEMORY") == "1")
+
+PALETTE = np.array([
+    (0.0, 0.0, 1.0),   # Blue
+    (0.0, 1.0, 1.0),   # Cyan
+    (0.0, 1.0, 0.0),   # Green
+    (1.0, 1.0, 0.0),   # Yellow
+    (1.0, 0.0, 0.0)    # Red
+])
+
+def prepare_vertex_color_set(obj, color_set='vertexColorSet'):
+    shape_node = cmds.listRelatives(obj, shapes=True)[0]
+    sel_list = om.MSelectionList()
+    sel_list.add(shape_node)
+    mesh = om.MFnMesh(sel_list.getDagPath(0))
+    
+    vertex_color_representation = om.MFnMesh.kRGB
+    if color_set not in mesh.getColorSetNames():
+        if color_set == PROXIMITY_DISTANCE_COLOR_SET:
+            # 距离不能被截断到 0-1
+            mesh.createColorSet(color_set, False, om.MFnMesh.kRGBA)
+        else:
+            mesh.createColorSet(color_set, vertex_color_representation)
+        profiler.count("maya_calls")
+    mesh.setCurrentColorSetName(color_set)
+    profiler.count("maya_calls", 3)
+    return mesh
+
+def write_vertex_colors(mesh, colors, start=0):
+    with profiler.stage("maya_write"):
+        mesh.setVertexColors(om.MColorArray(np.asarray(colors, dtype=np.float32).tolist()), list(range(start, start + len(colors))))
+    profiler.count("maya_calls")
+    profiler.count("colors_written", len(colors))
+
+@profiler.timed()
 def assign_vertex_colors(obj, colors):
     if obj:
-        start_time = time.time()
-        shape_node = cmds.listRelatives(obj, shapes=True)[0]
-        sel_list = om.MSelectionList()
-        sel_list.add(shape_node)
-        mesh = om.MFnMesh(sel_list.getDagPath(0))
-        
-        color_set = 'vertexColorSet'
-        vertex_color_representation = om.MFnMesh.kRGB
-        mesh.createColorSet(color_set, vertex_color_representation)
-        mesh.setCurrentColorSetName(color_set)
-        
-        np_colors = np.array(colors, dtype=np.float32)
-        mesh.setVertexColors(om.MColorArray(np_colors.tolist()), list(range(len(colors))))
+        mesh = prepare_vertex_color_set(obj)
+        write_vertex_colors(mesh, colors)
         cmds.polyOptions(obj, colorShadedDisplay=True)
-        
-        end_time = time.time()
-        execution_time = end_time - start_time
-        print(f"assign_vertex_colors execution time: {execution_time:.5f} seconds")
+        profiler.count("maya_calls")
     else:
         print("No object selected. Please select an object and run the script again.")
 
-def calculate_hausdorff_distance(obj1, obj2):
-    sel_list1 = om.MGlobal.getSelectionListByName(obj1)
-    dag_path1 = sel_list1.getDagPath(0)
-    
-    sel_list2 = om.MGlobal.getSelectionListByName(obj2)
-    dag_path2 = sel_list2.getDagPath(0)
-    
-    mesh1 = om.MFnMesh(dag_path1)
-    mesh2 = om.MFnMesh(dag_path2)
-    
-    vertices1 = mesh1.getPoints(om.MSpace.kWorld)
-    vertices2 = mesh2.getPoints(om.MSpace.kWorld)
-    
-    np_vertices1 = np.array([[v.x, v.y, v.z] for v in vertices1])
-    np_vertices2 = np.array([[v.x, v.y, v.z] for v in vertices2])
+def get_mesh_fn(obj):
+    sel_list = om.MGlobal.getSelectionListByName(obj)
+    return om.MFnMesh(sel_list.getDagPath(0))
+
+def chunk_size_for_memory_budget(memory_budget_mb):
+    return max(1024, int(memory_budget_mb * 1024 * 1024) // BYTES_PER_CHUNK_POINT)
+
+def iter_world_point_chunks(obj, chunk_size, dtype=np.float32):
+    """Yield (start_index, points) so only one chunk of Python floats is alive at a time"""
+    with profiler.stage("extract"):
+        vertices = get_mesh_fn(obj).getPoints(om.MSpace.kWorld)
+    profiler.count("maya_calls", 2)
+    vertex_count = len(vertices)
+    for start in range(0, vertex_count, chunk_size):
+        end = min(start + chunk_size, vertex_count)
+        with profiler.stage("extract"):
+            # 每个顶点只取一次 MPoint，索引 MPointArray 每次都会新建对象
+            points = np.array([(point.x, point.y, point.z) for point in (vertices[i] for i in range(start, end))], dtype=dtype)
+        profiler.count("points_extracted", end - start)
+        yield start, points
+
+def get_world_points(obj, dtype=np.float64, chunk_size=1000000):
+    np_vertices = np.empty((get_mesh_fn(obj).numVertices, 3), dtype=dtype)
+    for start, points in iter_world_point_chunks(obj, chunk_size, dtype):
+        np_vertices[start:start + len(points)] = points
+    return np_vertices
+
+def best_fit_transform(source_points, target_points):
+    """Least-squares rigid transform (Kabsch) mapping source_points onto target_points"""
+    source_centroid = source_points.mean(axis=0)
+    target_centroid = target_points.mean(axis=0)
+    covariance = (source_points - source_centroid).T @ (target_points - target_centroid)
+    u, _, vt = np.linalg.svd(covariance)
+    rotation = vt.T @ u.T
+    if np.linalg.det(rotation) < 0:
+        vt[-1, :] *= -1
+        rotation = vt.T @ u.T
+    translation = target_centroid - rotation @ source_centroid
+    return rotation, translation
+
+def align_points_icp(source_points, target_points, target_tree=None, level_sizes=(2000, 10000, 50000), max_iterations=30, tolerance=1e-6):
+    """Coarse-to-fine ICP. Returns rotation, translation with aligned = source @ rotation.T + translation"""
+    if target_tree is None:
+        target_tree = cKDTree(target_points)
+
+    rotation = np.eye(3)
+    translation = target_points.mean(axis=0) - source_points.mean(axis=0)
+
+    for level_size in level_sizes:
+        start_time = time.perf_counter()
+        step = max(1, len(source_points) // level_size)
+        sample = source_points[::step]
+
+        previous_error = None
+        with profiler.stage(f"icp_level_{len(sample)}"):
+            for iteration in range(max_iterations):
+                moved = sample @ rotation.T + translation
+                distances, indices = target_tree.query(moved)
+                profiler.count("points_queried", len(moved))
+                error = distances.mean()
+                if previous_error is not None and abs(previous_error - error) < tolerance:
+                    break
+                previous_error = error
+                step_rotation, step_translation = best_fit_transform(moved, target_points[indices])
+                rotation = step_rotation @ rotation
+                translation = step_rotation @ translation + step_translation
+
+        execution_time = time.perf_counter() - start_time
+        print(f"ICP level {len(sample)} points: {iteration + 1} iterations, mean error {error:.4f}, {execution_time:.5f} seconds")
+
+        if step == 1:
+            break
+
+    return rotation, translation
+
+def apply_rigid_transform(obj, rotation, translation):
+    world_matrix = get_world_matrix(obj)
+    # Maya matrices use row vectors, so the point transform goes in transposed
+    alignment_matrix = np.eye(4)
+    alignment_matrix[:3, :3] = rotation.T
+    alignment_matrix[3, :3] = translation
+    cmds.xform(obj, worldSpace=True, matrix=(world_matrix @ alignment_matrix).flatten().tolist())
+
+def report_rigid_transform(rotation, translation):
+    angle = np.degrees(np.arccos(np.clip((np.trace(rotation) - 1) / 2, -1.0, 1.0)))
+    print(f"Alignment rotation: {angle:.3f} deg, translation: ({translation[0]:.3f}, {translation[1]:.3f}, {translation[2]:.3f})")
+
+def align_objects(obj1, obj2, apply_alignment=True):
+    """Rigidly align obj1 onto obj2 with ICP, optionally writing the result to obj1's transform"""
+    np_vertices1 = get_world_points(obj1)
+    np_vertices2 = get_world_points(obj2)
+    rotation, translation = align_points_icp(np_vertices1, np_vertices2)
+    report_rigid_transform(rotation, translation)
+    if apply_alignment:
+        apply_rigid_transform(obj1, rotation, translation)
+    return rotation, translation
+
+@profiler.timed()
+def calculate_hausdorff_distance(obj1, obj2, align=False):
+    np_vertices1 = get_world_points(obj1)
+    np_vertices2 = get_world_points(obj2)
     
-    kdtree1 = cKDTree(np_vertices1)
-    kdtree2 = cKDTree(np_vertices2)
+    with profiler.stage("tree_build"):
+        kdtree2 = cKDTree(np_vertices2)
+
+    if align:
+        rotation, translation = align_points_icp(np_vertices1, np_vertices2, target_tree=kdtree2)
+        report_rigid_transform(rotation, translation)
+        np_vertices1 = np_vertices1 @ rotation.T + translation
+
+    with profiler.stage("tree_build"):
+        kdtree1 = cKDTree(np_vertices1)
     
-    distances1, _ = kdtree2.query(np_vertices1)
-    hausdorff_dist1 = np.max(distances1)
+    with profiler.stage("query"):
+        distances1, _ = kdtree2.query(np_vertices1)
+        hausdorff_dist1 = np.max(distances1)
 
-    distances2, _ = kdtree1.query(np_vertices2)
-    hausdorff_dist2 = np.max(distances2)
+        distances2, _ = kdtree1.query(np_vertices2)
+        hausdorff_dist2 = np.max(distances2)
+    profiler.count("points_queried", len(np_vertices1) + len(np_vertices2))
     
     hausdorff_dist = max(hausdorff_dist1, hausdorff_dist2)
     
@@ -63,8 +370,8 @@ def calculate_max_dimension(obj1, obj2):
                         bbox2[3] - bbox2[0], bbox2[4] - bbox2[1], bbox2[5] - bbox2[2])
     return max_dimension    
 
-def calculate_similarity_percentage(obj1, obj2):
-    distances1, distances2 = calculate_hausdorff_distance(obj1, obj2)
+def calculate_similarity_percentage(obj1, obj2, align=False):
+    distances1, distances2 = calculate_hausdorff_distance(obj1, obj2, align)
     print(f"Hausdorff distance1 obj1 -> obj2: {distances1:.3f}")
     print(f"Hausdorff distance1 obj2 -> obj1: {distances2:.3f}")
 
@@ -87,86 +394,1178 @@ def calculate_similarity_percentage(obj1, obj2):
     
     return hausdorff_similarity_percentage
 
-def calculate_min_distances(obj1, obj2):
-    start_time = time.time()
-    sel_list1 = om.MGlobal.getSelectionListByName(obj1)
-    dag_path1 = sel_list1.getDagPath(0)
+@profiler.timed()
+def calculate_min_distances(obj1, obj2, chunk_size=None, accumulator=None, distance_field=None, threshold_distance=None):
+    """
+    Per-vertex distance from obj1 to obj2 as float32. World points are queried in float32 chunks: Maya keeps
+    object-space points in single precision, but a non-identity transform makes the world-space values double,
+    so rounding them moves each distance by up to about one float32 step of the coordinates (~1e-5 at 100 units).
+    chunk_size only changes peak memory, not the result.
+    With a TemplateDistanceField of obj2 the distances are looked up instead of queried.
+    With the spatial index cache enabled, obj2's KD-tree and the obj1 -> obj2 distances are reused from disk.
+    """
+    vertex_count = get_mesh_fn(obj1).numVertices
+    chunk_size = chunk_size or max(vertex_count, 1)
+    cache = spatial_index_cache if distance_field is None else None
 
-    sel_list2 = om.MGlobal.getSelectionListByName(obj2)
-    dag_path2 = sel_list2.getDagPath(0)
-    
-    mesh1 = om.MFnMesh(dag_path1)
-    mesh2 = om.MFnMesh(dag_path2)
-        
-    vertices1 = mesh1.getPoints(om.MSpace.kWorld)
-    vertices2 = mesh2.getPoints(om.MSpace.kWorld)
-    
-    np_vertices1 = np.array([[v.x, v.y, v.z] for v in vertices1])
-    np_vertices2 = np.array([[v.x, v.y, v.z] for v in vertices2])
-    
-    kd_tree = cKDTree(np_vertices2)
-    distances, _ = kd_tree.query(np_vertices1)
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    print(f"calculate_min_distances execution time: {execution_time:.5f} seconds")
-    return distances.tolist()
+    if cache is not None:
+        # 缓存键需要完整的点数据，所以 obj1 的点一次性取出，只有查询本身分块
+        key1, points1 = cache.get_mesh(obj1)
+        key2, points2 = cache.get_mesh(obj2)
+        with profiler.stage("cache_load"):
+            distances = cache.load_distances(key1, key2)
+        if distances is not None:
+            if accumulator is not None:
+                for start in range(0, vertex_count, chunk_size):
+                    accumulator.update(distances[start:start + chunk_size])
+            print(f"calculate_min_distances loaded cached distances for {obj1} -> {obj2}")
+            return distances
+        with profiler.stage("tree_build"):
+            kd_tree = cache.get_kd_tree(key2, points2)
+        point_chunks = ((start, points1[start:start + chunk_size]) for start in range(0, vertex_count, chunk_size))
+    else:
+        point_chunks = iter_world_point_chunks(obj1, chunk_size)
+        if distance_field is None:
+            points2 = get_world_points(obj2, np.float32)
+            with profiler.stage("tree_build"):
+                kd_tree = cKDTree(points2)
+
+    if distance_field is None:
+        query_distances = lambda points: kd_tree.query(points)[0]
+    else:
+        query_distances = lambda points: distance_field.query(points, threshold_distance)
+
+    distances = query_min_distances(point_chunks, vertex_count, query_distances, accumulator)
+
+    if cache is not None:
+        with profiler.stage("cache_store"):
+            cache.store_distances(key1, key2, distances)
+    return distances
+
+class OperationCancelled(Exception):
+    pass
+
+def query_min_distances(point_chunks, vertex_count, query_distances, accumulator=None, progress=None, cancel_event=None):
+    distances = np.empty(vertex_count, dtype=np.float32)
+    for start, points in point_chunks:
+        if cancel_event is not None and cancel_event.is_set():
+            raise OperationCancelled()
+        end = start + len(points)
+        with profiler.stage("query"):
+            distances[start:end] = query_distances(points)
+        profiler.count("points_queried", len(points))
+        if accumulator is not None:
+            accumulator.update(distances[start:end])
+        if progress is not None:
+            progress(end / max(vertex_count, 1))
+    return distances
 
+def save_array(path, array):
+    with open(path, 'wb') as file:
+        np.save(file, array)
+
+def save_json(path, data):
+    with open(path, 'w') as file:
+        json.dump(data, file)
+
+def load_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+class SpatialIndexCache:
+    """
+    On-disk cache keyed by a content hash of a mesh's float32 world points.
+    Pair distances and the arrays of each KD-tree are stored as .npy and opened memory-mapped;
+    nothing is unpickled, so a shared cache directory cannot run code on load.
+    The least recently used files are evicted once the directory grows past max_size_mb.
+    """
+    def __init__(self, cache_dir=SPATIAL_INDEX_CACHE_DIR, max_size_mb=SPATIAL_INDEX_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_size_mb = max_size_mb
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, file_name):
+        return os.path.join(self.cache_dir, file_name)
+
+    def _load(self, file_name, loader):
+        path = self._path(file_name)
+        if not os.path.exists(path):
+            return None
+        # 用修改时间记录最近访问，淘汰时按它排序
+        os.utime(path)
+        return loader(path)
+
+    def _store(self, file_name, writer):
+        path = self._path(file_name)
+        temp_path = path + ".tmp"
+        writer(temp_path)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def mesh_key(self, points):
+        # KD-树和距离只取决于点，拓扑不参与缓存键
+        points = np.ascontiguousarray(points, dtype=np.float32)
+        digest = hashlib.sha1(np.array(points.shape, dtype=np.int64).tobytes())
+        digest.update(points.tobytes())
+        return digest.hexdigest()
+
+    def get_mesh(self, obj):
+        points = get_world_points(obj, np.float32)
+        return self.mesh_key(points), points
+
+    def get_kd_tree(self, key, points):
+        kd_tree = self.load_kd_tree(key)
+        if kd_tree is None:
+            kd_tree = cKDTree(points)
+            self.store_kd_tree(key, kd_tree)
+        return kd_tree
+
+    def load_kd_tree(self, key):
+        """Rebuild a cKDTree from its stored node/point/index arrays without re-sorting; None if missing or unusable"""
+        meta = self._load(f"{key}.kdtree.json", load_json)
+        if meta is None or meta.get("scipy_version") != scipy.__version__:
+            return None
+        try:
+            arrays = {name: self._load(f"{key}.kdtree.{name}.npy", lambda path: np.load(path, mmap_mode='r'))
+                      for name in KD_TREE_ARRAYS}
+            if any(array is None for array in arrays.values()):
+                return None
+            kd_tree = cKDTree.__new__(cKDTree)
+            kd_tree.__setstate__((arrays["nodes"], arrays["data"], meta["n"], meta["m"], meta["leafsize"],
+                                  np.array(meta["maxes"]), np.array(meta["mins"]), arrays["indices"], None, None))
+        except (OSError, ValueError, KeyError, TypeError):
+            # 文件被部分淘汰或来自不兼容的版本时直接重建
+            return None
+        return kd_tree
+
+    def store_kd_tree(self, key, kd_tree):
+        nodes, data, n, m, leafsize, maxes, mins, indices, _, _ = kd_tree.__getstate__()
+        for name, array in zip(KD_TREE_ARRAYS, (nodes, data, indices)):
+            self._store(f"{key}.kdtree.{name}.npy", lambda path, array=array: save_array(path, array))
+        # 元数据最后写：有它才说明数组都已写好
+        meta = {"scipy_version": scipy.__version__, "n": int(n), "m": int(m), "leafsize": int(leafsize),
+                "maxes": np.asarray(maxes).tolist(), "mins": np.asarray(mins).tolist()}
+        self._store(f"{key}.kdtree.json", lambda path: save_json(path, meta))
+
+    def load_distances(self, source_key, target_key):
+        return self._load(f"{source_key}_{target_key}.distances.npy", lambda path: np.load(path, mmap_mode='r'))
+
+    def store_distances(self, source_key, target_key, distances):
+        self._store(f"{source_key}_{target_key}.distances.npy", lambda path: save_array(path, distances))
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        max_size = self.max_size_mb * 1024 * 1024
+        for _, size, path in sorted(entries):
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Windows 上仍被内存映射的文件删不掉，留到下次淘汰
+                continue
+            total_size -= size
+
+    def clear(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file():
+                os.remove(entry.path)
+
+# 设为 None 可关闭磁盘缓存
+spatial_index_cache = None
+
+def enable_spatial_index_cache(cache_dir=SPATIAL_INDEX_CACHE_DIR, max_size_mb=SPATIAL_INDEX_CACHE_MAX_MB):
+    global spatial_index_cache
+    spatial_index_cache = SpatialIndexCache(cache_dir, max_size_mb)
+    return spatial_index_cache
+
+def disable_spatial_index_cache():
+    global spatial_index_cache
+    spatial_index_cache = None
+
+def get_points_and_kd_tree(obj):
+    """obj's float32 world points and their KD-tree, taken from the spatial index cache when it is enabled"""
+    if spatial_index_cache is not None:
+        key, points = spatial_index_cache.get_mesh(obj)
+        with profiler.stage("tree_build"):
+            return points, spatial_index_cache.get_kd_tree(key, points)
+    points = get_world_points(obj, np.float32)
+    with profiler.stage("tree_build"):
+        return points, cKDTree(points)
+
+def calculate_threshold_distance(obj1, obj2, similarity_threshold):
+    max_dimension = calculate_max_dimension(obj1, obj2)
+    return max_dimension * (1 - similarity_threshold / 100)
+
+class TemplateDistanceField:
+    """
+    Sparse voxel grid of exact distances to a reference mesh. Only 8x8x8-cell bricks within a band around
+    the surface are allocated; a small dense brick table maps brick coordinates to storage. Each brick also
+    stores the first node layer of its +X/+Y/+Z neighbours, so a cell's eight corners are one flat gather.
+    Distances are evaluated with trilinear interpolation: each value is within
+    voxel_size * sqrt(3) / 2 of the exact distance, while the threshold classification and each chunk's
+    maximum are re-queried exactly.
+    """
+    brick_size = 8
+    corner_offsets = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)], dtype=np.int64)
+
+    def __init__(self, name, reference_points, voxel_size, origin, brick_table, bricks, world_matrix=None):
+        self.name = name
+        self.reference_points = reference_points
+        self.voxel_size = float(voxel_size)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.brick_table = brick_table
+        self.bricks = bricks
+        # 建场时参考模型的世界矩阵，用来判断模型之后是否被移动过
+        self.world_matrix = None if world_matrix is None else np.asarray(world_matrix, dtype=np.float64)
+        self._kd_tree = None
+
+    @property
+    def node_strides(self):
+        nodes_per_axis = self.brick_size + 1
+        return np.array([nodes_per_axis * nodes_per_axis, nodes_per_axis, 1], dtype=np.int64)
+
+    @classmethod
+    @profiler.timed("distance_field_build")
+    def build(cls, name, reference_points, voxel_size, band_voxels=2, world_matrix=None):
+        reference_points = np.asarray(reference_points, dtype=np.float32)
+        origin = reference_points.min(axis=0) - (band_voxels + 1) * voxel_size
+        cells = np.floor((reference_points - origin) / voxel_size).astype(np.int64)
+        # 打包键每轴 21 位，膨胀后的节点坐标也必须放得下
+        if cells.max() + band_voxels + 2 >= 1 << 21:
+            raise ValueError(f"{name} spans more than {(1 << 21) - band_voxels - 2} voxels per axis; use a larger voxel size.")
+        node_keys = np.unique(cls._pack(cells))
+
+        # 逐轴膨胀，得到表面附近 band_voxels 范围内所有网格单元的角点
+        for axis in range(3):
+            steps = np.arange(-band_voxels, band_voxels + 2, dtype=np.int64) << (21 * axis)
+            node_keys = np.unique((node_keys[:, None] + steps).ravel())
+        nodes = cls._unpack(node_keys)
+
+        brick_coords, brick_ids = np.unique(nodes // cls.brick_size, axis=0, return_inverse=True)
+        brick_ids = brick_ids.ravel()
+        brick_table = np.full(brick_coords.max(axis=0) + 1, -1, dtype=np.int32)
+        brick_table[tuple(brick_coords.T)] = np.arange(len(brick_coords), dtype=np.int32)
+
+        field = cls(name, reference_points, voxel_size, origin, brick_table, None, world_matrix)
+        values = field.kd_tree.query(origin + nodes * voxel_size)[0].astype(np.float32)
+        field.bricks = np.full((len(brick_coords),) + (cls.brick_size + 1,) * 3, np.nan, dtype=np.float32)
+        local = nodes % cls.brick_size
+        field.bricks[brick_ids, local[:, 0], local[:, 1], local[:, 2]] = values
+
+        # 每个砖块边界上的节点同时写进 -X/-Y/-Z 方向相邻砖块的第 9 层
+        for offset in cls.corner_offsets[1:]:
+            on_border = np.all((local == 0) | (offset == 0), axis=1)
+            neighbour = brick_coords[brick_ids[on_border]] - offset
+            valid = np.all(neighbour >= 0, axis=1)
+            neighbour_ids = np.full(len(neighbour), -1, dtype=np.int32)
+            neighbour_ids[valid] = brick_table[tuple(neighbour[valid].T)]
+            valid = neighbour_ids >= 0
+            neighbour_local = local[on_border][valid] + offset * cls.brick_size
+            field.bricks[neighbour_ids[valid], neighbour_local[:, 0], neighbour_local[:, 1], neighbour_local[:, 2]] = values[on_border][valid]
+        print(f"Built distance field for {name}: {len(nodes)} nodes in {len(brick_coords)} bricks at voxel size {voxel_size:.4f}")
+        return field
+
+    @staticmethod
+    def _pack(coords):
+        return coords[:, 0] | (coords[:, 1] << 21) | (coords[:, 2] << 42)
+
+    @staticmethod
+    def _unpack(keys):
+        mask = (1 << 21) - 1
+        return np.stack([keys & mask, (keys >> 21) & mask, keys >> 42], axis=-1)
+
+    @property
+    def kd_tree(self):
+        if self._kd_tree is None:
+            self._kd_tree = cKDTree(self.reference_points)
+        return self._kd_tree
+
+    def query(self, points, threshold_distance=None):
+        """
+        Interpolated distances; falls back to the exact KD-tree outside the band, near the threshold
+        and wherever a point could be the maximum of this batch
+        """
+        points = np.asarray(points, dtype=np.float64)
+        relative = (points - self.origin) / self.voxel_size
+        base = np.floor(relative).astype(np.int64)
+        fraction = relative - base
+
+        brick = base // self.brick_size
+        local = base - brick * self.brick_size
+        in_grid = np.all((brick >= 0) & (brick < self.brick_table.shape), axis=1)
+        brick[~in_grid] = 0
+        brick_index = self.brick_table[brick[:, 0], brick[:, 1], brick[:, 2]]
+        in_grid &= brick_index >= 0
+
+        node_strides = self.node_strides
+        flat_index = brick_index * node_strides[0] * (self.brick_size + 1) + local @ node_strides
+        flat_index[~in_grid] = 0
+        corners = self.bricks.reshape(-1)[flat_index[:, None] + self.corner_offsets @ node_strides].reshape(-1, 2, 2, 2)
+        # 依次沿 Z、Y、X 线性插值
+        corners = corners[..., 0] + (corners[..., 1] - corners[..., 0]) * fraction[:, 2, None, None]
+        corners = corners[..., 0] + (corners[..., 1] - corners[..., 0]) * fraction[:, 1, None]
+        distances = corners[:, 0] + (corners[:, 1] - corners[:, 0]) * fraction[:, 0]
+        in_grid &= ~np.isnan(distances)
+
+        # 距离函数是 1-Lipschitz 的：误差不超过 sum(w_i * |p - c_i|) <= voxel_size * sqrt(sum(f * (1 - f)))
+        error_bound = self.voxel_size * np.sqrt(np.sum(fraction * (1 - fraction), axis=1))
+        exact = ~in_grid
+        if threshold_distance is not None:
+            exact |= np.abs(distances - threshold_distance) <= error_bound
+        if not np.all(exact):
+            # 可能成为这一批最大值的点查精确值，Hausdorff 距离和颜色上限不带插值误差
+            exact |= distances + error_bound >= np.max((distances - error_bound)[~exact])
+        if np.any(exact):
+            distances[exact] = self.kd_tree.query(points[exact])[0]
+        profiler.count("distance_field_exact_queries", int(np.count_nonzero(exact)))
+        return distances.astype(np.float32)
+
+    def save(self, file_path):
+        np.savez(file_path, name=self.name, reference_points=self.reference_points, voxel_size=self.voxel_size,
+                 origin=self.origin, brick_table=self.brick_table, bricks=self.bricks,
+                 world_matrix=np.full((4, 4), np.nan) if self.world_matrix is None else self.world_matrix)
+        print(f"Saved distance field for {self.name} to {file_path}")
+
+    @classmethod
+    def load(cls, file_path):
+        # 用 with 关闭文件，否则 Windows 上 .npz 会一直被占用
+        with np.load(file_path) as data:
+            if data["bricks"].shape[1] != cls.brick_size + 1:
+                raise ValueError(f"{file_path} was saved in an older distance field format; please rebuild it.")
+            world_matrix = data["world_matrix"] if "world_matrix" in data.files else None
+            if world_matrix is not None and np.isnan(world_matrix).any():
+                world_matrix = None
+            return cls(str(data["name"]), data["reference_points"], float(data["voxel_size"]),
+                       data["origin"], data["brick_table"], data["bricks"], world_matrix)
+
+def get_world_matrix(obj):
+    return np.array(cmds.xform(obj, query=True, worldSpace=True, matrix=True)).reshape(4, 4)
+
+def build_template_distance_field(obj, voxel_size=None, band_voxels=2):
+    reference_points = get_world_points(obj, np.float32)
+    if voxel_size is None:
+        bbox = cmds.exactWorldBoundingBox(obj)
+        voxel_size = max(bbox[3] - bbox[0], bbox[4] - bbox[1], bbox[5] - bbox[2]) / 512
+    return TemplateDistanceField.build(obj, reference_points, voxel_size, band_voxels, get_world_matrix(obj))
+
+def get_template_distance_field(obj):
+    """obj's precomputed distance field, or None if there is none or obj has moved since it was built"""
+    distance_field = template_distance_fields.get(obj)
+    if distance_field is None:
+        return None
+    if distance_field.world_matrix is not None and not np.allclose(get_world_matrix(obj), distance_field.world_matrix):
+        print(f"{obj} has moved since its distance field was built; querying it exactly instead.")
+        return None
+    return distance_field
+
+# 参考模型名 -> 预计算的距离场，目标模型在这里时对比直接查表
+template_distance_fields = {}
+
+@dataclass
+class DeviationReport:
+    source: str
+    target: str
+    vertex_count: int
+    min_distance: float
+    max_distance: float
+    mean_distance: float
+    rms_distance: float
+    median_distance: float
+    p95_distance: float
+    p99_distance: float
+    tolerance: float
+    within_tolerance_percentage: float
+    histogram_counts: np.ndarray
+    histogram_edges: np.ndarray
+    # 距离来自插值的距离场：最大值和容差判断是精确的，其余统计是近似值
+    approximate: bool = False
+
+    def to_dict(self):
+        report = dict(self.__dict__)
+        report["histogram_counts"] = self.histogram_counts.tolist()
+        report["histogram_edges"] = self.histogram_edges.tolist()
+        return report
+
+class DeviationAccumulator:
+    """
+    Streaming deviation statistics: feed distance chunks with update(), read the result with report().
+    Percentiles come from a fine log-spaced histogram, so they are exact to within one bin
+    (about 0.4% of the value) without keeping the distances around. The report's histogram counts are exact
+    when report() is given the distances (a second chunked pass); otherwise they are interpolated from the fine bins.
+    """
+    fine_bin_count = 4096
+    fine_range_ratio = 1e-7
+
+    def __init__(self, tolerance, scale, histogram_bins=20):
+        self.tolerance = tolerance
+        self.histogram_bins = histogram_bins
+        scale = max(scale, np.finfo(np.float32).tiny)
+        self.fine_edges = np.geomspace(scale * self.fine_range_ratio, scale, self.fine_bin_count + 1)
+        # 多出的两格分别存放低于和超出对数范围的距离
+        self.fine_counts = np.zeros(self.fine_bin_count + 2, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.total_squared = 0.0
+        self.within_tolerance = 0
+        self.min_distance = np.inf
+        self.max_distance = -np.inf
+
+    def update(self, distances):
+        distances = np.asarray(distances, dtype=np.float64)
+        if not len(distances):
+            return
+        self.count += len(distances)
+        self.total += distances.sum()
+        self.total_squared += np.dot(distances, distances)
+        self.within_tolerance += np.count_nonzero(distances <= self.tolerance)
+        self.min_distance = min(self.min_distance, distances.min())
+        self.max_distance = max(self.max_distance, distances.max())
+        bin_indices = np.searchsorted(self.fine_edges, distances, side='right')
+        self.fine_counts += np.bincount(bin_indices, minlength=len(self.fine_counts))
+
+    def _fine_bin_bounds(self):
+        lower = np.concatenate(([self.min_distance], self.fine_edges))
+        upper = np.concatenate((self.fine_edges, [self.max_distance]))
+        return np.clip(lower, self.min_distance, self.max_distance), np.clip(upper, self.min_distance, self.max_distance)
+
+    def _cumulative_at(self, values):
+        lower, upper = self._fine_bin_bounds()
+        cumulative = np.cumsum(self.fine_counts)
+        # 在每个细分格内按线性分布插值
+        positions = np.searchsorted(upper, values, side='left').clip(0, len(upper) - 1)
+        width = upper[positions] - lower[positions]
+        fraction = np.where(width > 0, (values - lower[positions]) / np.where(width > 0, width, 1), 1.0)
+        before = np.where(positions > 0, cumulative[positions - 1], 0)
+        return before + self.fine_counts[positions] * np.clip(fraction, 0.0, 1.0)
+
+    def _quantile(self, q):
+        lower, upper = self._fine_bin_bounds()
+        cumulative = np.cumsum(self.fine_counts)
+        rank = q * self.count
+        position = min(np.searchsorted(cumulative, rank, side='left'), len(cumulative) - 1)
+        before = cumulative[position - 1] if position > 0 else 0
+        in_bin = self.fine_counts[position]
+        fraction = (rank - before) / in_bin if in_bin else 0.0
+        return float(lower[position] + (upper[position] - lower[position]) * fraction)
+
+    def _histogram_counts(self, histogram_edges, distances, chunk_size):
+        if distances is None or histogram_edges[-1] <= histogram_edges[0]:
+            cumulative = self._cumulative_at(histogram_edges)
+            cumulative[0], cumulative[-1] = 0, self.count
+            return np.diff(np.round(cumulative)).astype(np.int64)
+        # 区间要等最小/最大值确定后才知道，所以精确计数是第二遍
+        histogram_counts = np.zeros(self.histogram_bins, dtype=np.int64)
+        for start in range(0, len(distances), chunk_size):
+            histogram_counts += np.histogram(distances[start:start + chunk_size], histogram_edges)[0]
+        return histogram_counts
+
+    def report(self, source=None, target=None, approximate=False, distances=None, chunk_size=1000000):
+        if not self.count:
+            raise ValueError("No distances were accumulated.")
+        mean_distance = self.total / self.count
+        histogram_edges = np.linspace(self.min_distance, self.max_distance, self.histogram_bins + 1)
+        histogram_counts = self._histogram_counts(histogram_edges, distances, chunk_size)
+        return DeviationReport(
+            source=source,
+            target=target,
+            vertex_count=int(self.count),
+            min_distance=float(self.min_distance),
+            max_distance=float(self.max_distance),
+            mean_distance=float(mean_distance),
+            rms_distance=float(np.sqrt(self.total_squared / self.count)),
+            median_distance=self._quantile(0.5),
+            p95_distance=self._quantile(0.95),
+            p99_distance=self._quantile(0.99),
+            tolerance=float(self.tolerance),
+            within_tolerance_percentage=float(self.within_tolerance / self.count * 100),
+            histogram_counts=histogram_counts,
+            histogram_edges=histogram_edges,
+            approximate=approximate,
+        )
+
+def calculate_deviation_report(distances, tolerance, scale, source=None, target=None, chunk_size=1000000, approximate=False):
+    accumulator = DeviationAccumulator(tolerance, scale)
+    for start in range(0, len(distances), chunk_size):
+        accumulator.update(distances[start:start + chunk_size])
+    return accumulator.report(source, target, approximate, distances, chunk_size)
+
+def print_deviation_report(report):
+    print(f"\n################### Deviation {report.source} -> {report.target} ###################")
+    print(f"Vertices: {report.vertex_count}")
+    print(f"Min / Max: {report.min_distance:.4f} / {report.max_distance:.4f}")
+    print(f"Mean: {report.mean_distance:.4f}  RMS: {report.rms_distance:.4f}")
+    print(f"Median: {report.median_distance:.4f}  P95: {report.p95_distance:.4f}  P99: {report.p99_distance:.4f}")
+    print(f"Within tolerance ({report.tolerance:.4f}): {report.within_tolerance_percentage:.2f}%")
+    if report.approximate:
+        print("Interpolated from a distance field: max and within tolerance are exact, the other statistics approximate")
+    peak = max(report.histogram_counts.max(), 1)
+    for count, low, high in zip(report.histogram_counts, report.histogram_edges[:-1], report.histogram_edges[1:]):
+        print(f"{low:9.4f} - {high:9.4f} | {'#' * int(40 * count / peak)} {count}")
+    print(f"################### Deviation {report.source} -> {report.target} ###################\n")
+
+def export_deviation_reports(reports, file_path):
+    with open(file_path, 'w') as file:
+        json.dump([report.to_dict() for report in reports], file, indent=2)
+    print(f"Exported {len(reports)} deviation reports to {file_path}")
+
+def distances_to_color_array(distances, min_distance, max_distance, threshold_distance):
+    distances = np.asarray(distances, dtype=np.float64)
+    min_distance, max_distance = float(min_distance), float(max_distance)
+    distance_range = max_distance - min_distance
+    if distance_range > 0:
+        normalized = (distances - min_distance) / distance_range
+    else:
+        normalized = np.zeros_like(distances)
+
+    scaled = np.clip(normalized, 0.0, 1.0) * (len(PALETTE) - 1)
+    index = np.minimum(scaled.astype(np.int64), len(PALETTE) - 2)
+    t = (scaled - index)[:, None]
+    colors = PALETTE[index] + (PALETTE[index + 1] - PALETTE[index]) * t
+
+    # 距离小于阈值距离（即相似度高于阈值）的顶点设置为蓝色，超出范围的顶点取调色板两端
+    colors[normalized <= 0] = PALETTE[0]
+    colors[normalized >= 1.0] = PALETTE[-1]
+    colors[distances <= threshold_distance] = PALETTE[0]
+    return colors.astype(np.float32)
+
+@profiler.timed()
 def map_distances_to_colors(distances, use_binary_color=False, obj1=None, obj2=None, similarity_threshold=99.5):
-    start_time = time.time()
-    min_distance = min(distances)
-    max_distance = max(distances)
-    normalized_distances = [(d - min_distance) / (max_distance - min_distance) for d in distances]
-
-    palette = [
-        (0.0, 0.0, 1.0),   # Blue
-        (0.0, 1.0, 1.0),   # Cyan
-        (0.0, 1.0, 0.0),   # Green
-        (1.0, 1.0, 0.0),   # Yellow
-        (1.0, 0.0, 0.0)    # Red
-    ]
-    
-    colors = []
+    threshold_distance = calculate_threshold_distance(obj1, obj2, similarity_threshold)
+    return distances_to_color_array(distances, np.min(distances), np.max(distances), threshold_distance)
+
+@dataclass
+class StoredDistances:
+    distances: np.ndarray
+    max_dimension: float
+    target: str
+    # 存储时源/目标模型的世界矩阵和包围盒；target_state 为 None 表示目标不是场景里的模型（如镜像对称）
+    source_state: np.ndarray
+    target_state: np.ndarray = None
+    # 距离是否来自插值的距离场
+    approximate: bool = False
+
+# 网格名 -> StoredDistances，拖动阈值时直接用内存里的距离重新着色
+stored_proximity_distances = {}
+
+def get_mesh_state(obj):
+    """World matrix and world bounding box: cheap to read, and they change when the mesh is moved or most edits are made"""
+    return np.concatenate([get_world_matrix(obj).ravel(), cmds.exactWorldBoundingBox(obj)])
+
+def stored_distances_are_current(obj, stored):
+    if stored.source_state is None or not np.allclose(get_mesh_state(obj), stored.source_state):
+        return False
+    if stored.target_state is not None:
+        return bool(cmds.objExists(stored.target)) and np.allclose(get_mesh_state(stored.target), stored.target_state)
+    return True
+
+def proximity_sidecar_path(obj):
+    """<scene>.<obj>.proximity.npz next to the saved scene, or None for an unsaved scene"""
+    scene_path = cmds.file(query=True, sceneName=True)
+    if not scene_path:
+        return None
+    safe_name = obj.strip('|').replace('|', '_').replace(':', '_')
+    return f"{os.path.splitext(scene_path)[0]}.{safe_name}.proximity.npz"
+
+def set_custom_attribute(obj, name, value):
+    is_string = isinstance(value, str)
+    if not cmds.attributeQuery(name, node=obj, exists=True):
+        if is_string:
+            cmds.addAttr(obj, longName=name, dataType='string')
+        else:
+            cmds.addAttr(obj, longName=name, attributeType='double')
+    if is_string:
+        cmds.setAttr(f"{obj}.{name}", value, type='string')
+    else:
+        cmds.setAttr(f"{obj}.{name}", value)
+
+@profiler.timed()
+def store_proximity_distances(obj, target, distances, max_dimension, chunk_size=None, target_is_mesh=True, approximate=False):
+    """
+    Keep obj's per-vertex distances to target on the mesh (proximityDistance color set plus
+    attributes) and in a sidecar .npz next to the scene, so it can be recolored without re-querying target.
+    Both meshes' current state is recorded so the distances are rejected once either one changes.
+    """
+    # 复制一份：缓存里读出的是内存映射文件，一直引用会让 Windows 上无法淘汰/替换它
+    distances = np.array(distances, dtype=np.float32)
+    source_state = get_mesh_state(obj)
+    target_state = get_mesh_state(target) if target_is_mesh else None
+    stored_proximity_distances[obj] = StoredDistances(distances, float(max_dimension), target, source_state, target_state, approximate)
+
+    chunk_size = chunk_size or max(len(distances), 1)
+    mesh = prepare_vertex_color_set(obj, PROXIMITY_DISTANCE_COLOR_SET)
+    for start in range(0, len(distances), chunk_size):
+        chunk = distances[start:start + chunk_size]
+        channel = np.zeros((len(chunk), 4), dtype=np.float32)
+        channel[:, 0] = chunk
+        channel[:, 3] = 1.0
+        write_vertex_colors(mesh, channel, start)
+    # 显示用的颜色集切回来
+    prepare_vertex_color_set(obj)
+    set_custom_attribute(obj, PROXIMITY_TARGET_ATTRIBUTE, target)
+    set_custom_attribute(obj, PROXIMITY_MAX_DIMENSION_ATTRIBUTE, float(max_dimension))
+    set_custom_attribute(obj, PROXIMITY_MESH_STATE_ATTRIBUTE, json.dumps({
+        "source": source_state.tolist(), "target": None if target_state is None else target_state.tolist(), "approximate": approximate}))
+
+    sidecar_path = proximity_sidecar_path(obj)
+    if sidecar_path:
+        with profiler.stage("sidecar_write"):
+            np.savez(sidecar_path, distances=distances, max_dimension=max_dimension, target=target, source_state=source_state,
+                     target_state=np.full_like(source_state, np.nan) if target_state is None else target_state, approximate=approximate)
+
+@profiler.timed()
+def load_proximity_distances(obj, chunk_size=1000000):
+    """
+    StoredDistances for obj, from memory, the sidecar file or the color set; None if absent or if obj or
+    its target has changed since they were stored.
+    The color set is the slow fallback: the Python API hands back one MColor per vertex.
+    """
+    vertex_count = get_mesh_fn(obj).numVertices
+    stored = stored_proximity_distances.get(obj)
+    if stored is not None and len(stored.distances) != vertex_count:
+        stored = None
+
+    sidecar_path = proximity_sidecar_path(obj)
+    if stored is None and sidecar_path and os.path.exists(sidecar_path):
+        with np.load(sidecar_path) as data:
+            if len(data["distances"]) == vertex_count and "source_state" in data.files:
+                target_state = data["target_state"]
+                stored = StoredDistances(data["distances"].astype(np.float32), float(data["max_dimension"]), str(data["target"]),
+                                         data["source_state"], None if np.isnan(target_state).any() else target_state,
+                                         "approximate" in data.files and bool(data["approximate"]))
+
+    if stored is None and cmds.attributeQuery(PROXIMITY_MESH_STATE_ATTRIBUTE, node=obj, exists=True):
+        mesh = get_mesh_fn(obj)
+        if PROXIMITY_DISTANCE_COLOR_SET in mesh.getColorSetNames():
+            with profiler.stage("maya_read"):
+                colors = mesh.getVertexColors(PROXIMITY_DISTANCE_COLOR_SET)
+                distances = np.empty(len(colors), dtype=np.float32)
+                for start in range(0, len(colors), chunk_size):
+                    end = min(start + chunk_size, len(colors))
+                    distances[start:end] = [colors[i].r for i in range(start, end)]
+            profiler.count("maya_calls")
+            mesh_state = json.loads(cmds.getAttr(f"{obj}.{PROXIMITY_MESH_STATE_ATTRIBUTE}"))
+            stored = StoredDistances(distances, cmds.getAttr(f"{obj}.{PROXIMITY_MAX_DIMENSION_ATTRIBUTE}"),
+                                     cmds.getAttr(f"{obj}.{PROXIMITY_TARGET_ATTRIBUTE}"), np.array(mesh_state["source"]),
+                                     None if mesh_state["target"] is None else np.array(mesh_state["target"]),
+                                     mesh_state.get("approximate", False))
+
+    if stored is not None and not stored_distances_are_current(obj, stored):
+        print(f"Stored distances of {obj} are out of date; the comparison has to run again.")
+        stored = None
+    if stored is None:
+        stored_proximity_distances.pop(obj, None)
+    else:
+        stored_proximity_distances[obj] = stored
+    return stored
+
+@profiler.timed()
+def recolor_from_stored_distances(obj, similarity_threshold=99.5, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """Re-threshold, recolor and recompute statistics from obj's stored distances; None if there are none"""
+    stored = load_proximity_distances(obj)
+    if stored is None:
+        cmds.warning(f"{obj} has no stored distances. Run a Hausdorff color comparison first.")
+        return None
+
+    distances, max_dimension, target = stored.distances, stored.max_dimension, stored.target
+    chunk_size = chunk_size_for_memory_budget(memory_budget_mb) if memory_budget_mb else max(len(distances), 1)
+    threshold_distance = max_dimension * (1 - similarity_threshold / 100)
+    report = calculate_deviation_report(distances, threshold_distance, max_dimension, obj, target, chunk_size, stored.approximate)
+
+    mesh = prepare_vertex_color_set(obj)
+    for start in range(0, len(distances), chunk_size):
+        with profiler.stage("color_map"):
+            colors = distances_to_color_array(distances[start:start + chunk_size], report.min_distance, report.max_distance, threshold_distance)
+        write_vertex_colors(mesh, colors, start)
+    cmds.polyOptions(obj, colorShadedDisplay=True)
+    profiler.count("maya_calls")
+    return report
+
+def stored_distances_available(objects):
+    """True if every object has stored distances and, for a pair, they were measured against each other"""
+    stored = [load_proximity_distances(obj) for obj in objects]
+    if not objects or any(entry is None for entry in stored):
+        return False
+    return len(objects) != 2 or (stored[0].target == objects[1] and stored[1].target == objects[0])
+
+@profiler.timed()
+def visualize_object_proximity(obj1, obj2, use_binary_color, similarity_threshold, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Streamed extract -> query -> color -> write in chunks sized from memory_budget_mb.
+    Pass memory_budget_mb=None to process the whole mesh as a single chunk.
+    """
+    vertex_count = get_mesh_fn(obj1).numVertices
+    chunk_size = chunk_size_for_memory_budget(memory_budget_mb) if memory_budget_mb else max(vertex_count, 1)
+
     max_dimension = calculate_max_dimension(obj1, obj2)
     threshold_distance = max_dimension * (1 - similarity_threshold / 100)
-    
-    for d in distances:
-        if d <= threshold_distance:
-            # 如果距离小于阈值距离（即相似度高于阈值），设置为蓝色
-            color = palette[0]
+    accumulator = DeviationAccumulator(threshold_distance, max_dimension)
+    distance_field = get_template_distance_field(obj2)
+    distances = calculate_min_distances(obj1, obj2, chunk_size, accumulator, distance_field, threshold_distance)
+
+    # 颜色归一化需要全局的最小/最大距离，所以写颜色是第二遍
+    mesh = prepare_vertex_color_set(obj1)
+    for start in range(0, vertex_count, chunk_size):
+        with profiler.stage("color_map"):
+            colors = distances_to_color_array(distances[start:start + chunk_size], accumulator.min_distance, accumulator.max_distance, threshold_distance)
+        write_vertex_colors(mesh, colors, start)
+    cmds.polyOptions(obj1, colorShadedDisplay=True)
+    profiler.count("maya_calls")
+    approximate = distance_field is not None
+    store_proximity_distances(obj1, obj2, distances, max_dimension, chunk_size, approximate=approximate)
+    return accumulator.report(obj1, obj2, approximate, distances, chunk_size)
+
+def compare_against_reference(reference, candidates, similarity_threshold=99.5):
+    """Batch mode: deviation of every candidate from the reference, without touching vertex colors"""
+    reports = []
+    distance_field = get_template_distance_field(reference)
+    for candidate in candidates:
+        threshold_distance = calculate_threshold_distance(candidate, reference, similarity_threshold)
+        distances = calculate_min_distances(candidate, reference, distance_field=distance_field, threshold_distance=threshold_distance)
+        reports.append(calculate_deviation_report(distances, threshold_distance, calculate_max_dimension(candidate, reference), candidate, reference,
+                                                  approximate=distance_field is not None))
+    return reports
+
+last_deviation_reports = []
+
+class ShapeRetrievalIndex:
+    """
+    Per-scan shape descriptors in one float32 array, used to shortlist the scans most like a query
+    before running the exact Hausdorff comparison. Each row is
+    [bounding extents (3) | principal standard deviations (3) | radial histogram (radial_bins)],
+    all invariant to where the scan sits in the scene.
+    """
+    EXTENT_COLUMNS = slice(0, 3)
+
+    def __init__(self, names=(), descriptors=None, radial_bins=16):
+        self.names = list(names)
+        self.radial_bins = radial_bins
+        self.descriptors = np.zeros((0, 6 + radial_bins), dtype=np.float32) if descriptors is None else np.asarray(descriptors, dtype=np.float32)
+
+    def compute_descriptor(self, points):
+        points = np.asarray(points, dtype=np.float64)
+        extents = points.max(axis=0) - points.min(axis=0)
+        centered = points - points.mean(axis=0)
+        moments = np.sqrt(np.maximum(np.linalg.eigvalsh(np.cov(centered.T))[::-1], 0))
+        # 到质心距离的分布，按最大半径归一化，只描述形状
+        radii = np.linalg.norm(centered, axis=1)
+        histogram = np.histogram(radii / max(radii.max(), 1e-12), bins=self.radial_bins, range=(0.0, 1.0))[0] / len(radii)
+        return np.concatenate([extents, moments, histogram]).astype(np.float32)
+
+    def add(self, name, points):
+        descriptor = self.compute_descriptor(points)
+        if name in self.names:
+            self.descriptors[self.names.index(name)] = descriptor
         else:
-            # 对于其他情况，使用颜色插值
-            normalized_d = (d - min_distance) / (max_distance - min_distance)
-            if normalized_d <= 0:
-                color = palette[0]
-            elif normalized_d >= 1.0:
-                color = palette[-1]
-            else:
-                index = int(normalized_d * (len(palette) - 1))
-                t = normalized_d * (len(palette) - 1) - index
-                color1 = palette[index]
-                color2 = palette[index + 1]
-                color = tuple(c1 + (c2 - c1) * t for c1, c2 in zip(color1, color2))
-        colors.append(color)
-    
-    end_time = time.time()
-    execution_time = end_time - start_time
-    print(f"map_distances_to_colors execution time: {execution_time:.5f} seconds")    
-    return colors
+            self.names.append(name)
+            self.descriptors = np.vstack([self.descriptors, descriptor])
+
+    def rank(self, descriptor):
+        """Indices of the indexed scans sorted by standardized descriptor distance, and those distances"""
+        # 各列按索引内的离散程度标准化；离散程度至少算作列均值的 1%，免得几乎不变的列放大噪声
+        scale = np.maximum(self.descriptors.std(axis=0), 0.01 * np.abs(self.descriptors).mean(axis=0) + 1e-6)
+        scores = np.linalg.norm((self.descriptors - descriptor) / scale, axis=1)
+        order = np.argsort(scores, kind='stable')
+        return order, scores[order]
+
+    def lower_bounds(self, descriptor):
+        """
+        Lower bound on the Hausdorff distance under any translation: projecting onto an axis can only
+        shrink it, and two intervals whose lengths differ by d are at least d / 2 apart.
+        """
+        extent_differences = np.abs(self.descriptors[:, self.EXTENT_COLUMNS] - descriptor[self.EXTENT_COLUMNS])
+        return extent_differences.max(axis=1) / 2
+
+    @profiler.timed()
+    def query(self, obj, top_k=5, align=False):
+        """
+        Exact centroid-centred Hausdorff distance (after ICP if align) from obj to the top_k ranked scans.
+        Shortlisted scans whose lower bound cannot beat the best distance so far are skipped;
+        the bound assumes translation only, so it is not used with align.
+        """
+        # 查询模型的树按中心化坐标另建，这里只要顶点
+        points = get_world_points(obj, np.float32)
+        descriptor = self.compute_descriptor(points)
+        order, scores = self.rank(descriptor)
+        lower_bounds = self.lower_bounds(descriptor)
+
+        centered = points - points.mean(axis=0)
+        with profiler.stage("tree_build"):
+            query_tree = cKDTree(centered)
+
+        shortlist = [(index, score) for index, score in zip(order, scores) if self.names[index] != obj][:top_k]
+        matches = []
+        best_distance = np.inf
+        for index, score in shortlist:
+            name = self.names[index]
+            if not align and lower_bounds[index] >= best_distance:
+                profiler.count("candidates_pruned")
+                continue
+
+            candidate_points, candidate_tree = get_points_and_kd_tree(name)
+            offset = candidate_points.mean(axis=0)
+            query_points = centered + offset
+            if align:
+                rotation, translation = align_points_icp(query_points, candidate_points, target_tree=candidate_tree)
+                query_points = query_points @ rotation.T + translation
+                query_tree = cKDTree(query_points - offset)
+            with profiler.stage("query"):
+                forward = candidate_tree.query(query_points)[0].max()
+                backward = query_tree.query(candidate_points - offset)[0].max()
+            profiler.count("points_queried", len(query_points) + len(candidate_points))
+
+            hausdorff_distance = float(max(forward, backward))
+            max_dimension = float(max(descriptor[self.EXTENT_COLUMNS].max(), self.descriptors[index, self.EXTENT_COLUMNS].max()))
+            matches.append((name, hausdorff_distance, (1 - hausdorff_distance / max_dimension) * 100, float(score)))
+            best_distance = min(best_distance, hausdorff_distance)
+        return sorted(matches, key=lambda match: match[1])
+
+    def save(self, file_path):
+        np.savez(file_path, names=np.array(self.names), descriptors=self.descriptors, radial_bins=self.radial_bins)
+        print(f"Saved retrieval index of {len(self.names)} scans to {file_path}")
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as data:
+            return cls([str(name) for name in data["names"]], data["descriptors"], int(data["radial_bins"]))
+
+def build_shape_retrieval_index(objects=None):
+    """Index every b_<folder> scan in the scene (or the given objects)"""
+    index = ShapeRetrievalIndex()
+    for obj in objects if objects is not None else cmds.ls("b_*", type='transform') or []:
+        with profiler.stage("descriptor"):
+            index.add(obj, get_world_points(obj, np.float32))
+    return index
+
+def print_retrieval_matches(obj, matches):
+    print("\n################### Most Similar Scans ###################")
+    print(f"Query: {obj}")
+    for name, hausdorff_distance, similarity_percentage, score in matches:
+        print(f"{name}: Hausdorff {hausdorff_distance:.3f}, similarity {similarity_percentage:.2f}%, descriptor distance {score:.3f}")
+    print("################### Most Similar Scans ###################\n")
+
+# 当前场景扫描模型的检索索引
+shape_retrieval_index = ShapeRetrievalIndex()
+
+@profiler.timed()
+def calculate_symmetry_distances(obj, axis="X", plane_offset=None, chunk_size=None):
+    """
+    Per-vertex asymmetry of a single mesh: each vertex is mirrored across the plane axis = plane_offset
+    (through the centroid by default) in memory and queried against the mesh's own KD-tree.
+    """
+    points, kd_tree = get_points_and_kd_tree(obj)
+    axis_index = "XYZ".index(axis)
+    if plane_offset is None:
+        plane_offset = float(points[:, axis_index].mean(dtype=np.float64))
+
+    vertex_count = len(points)
+    chunk_size = chunk_size or max(vertex_count, 1)
+    def mirrored_chunks():
+        for start in range(0, vertex_count, chunk_size):
+            mirrored = np.array(points[start:start + chunk_size], dtype=np.float32)
+            mirrored[:, axis_index] = 2 * plane_offset - mirrored[:, axis_index]
+            yield start, mirrored
+
+    distances = query_min_distances(mirrored_chunks(), vertex_count, lambda chunk: kd_tree.query(chunk)[0])
+    return distances, plane_offset
+
+def visualize_symmetry(obj, axis="X", similarity_threshold=99.5, plane_offset=None, with_visualization=True,
+                       memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Mirror symmetry of obj as 1 - max asymmetry / max dimension, colored with the proximity palette.
+    The distances are stored against the target "<obj> mirrored in <axis>", so only a single-object recolor reuses them.
+    """
+    chunk_size = chunk_size_for_memory_budget(memory_budget_mb) if memory_budget_mb else None
+    distances, plane_offset = calculate_symmetry_distances(obj, axis, plane_offset, chunk_size)
+    chunk_size = chunk_size or max(len(distances), 1)
+
+    bbox = cmds.exactWorldBoundingBox(obj)
+    max_dimension = max(bbox[3] - bbox[0], bbox[4] - bbox[1], bbox[5] - bbox[2])
+    threshold_distance = max_dimension * (1 - similarity_threshold / 100)
+    mirror_target = f"{obj} mirrored in {axis}"
+    report = calculate_deviation_report(distances, threshold_distance, max_dimension, obj, mirror_target, chunk_size)
+
+    if with_visualization:
+        mesh = prepare_vertex_color_set(obj)
+        for start in range(0, len(distances), chunk_size):
+            with profiler.stage("color_map"):
+                colors = distances_to_color_array(distances[start:start + chunk_size], report.min_distance, report.max_distance, threshold_distance)
+            write_vertex_colors(mesh, colors, start)
+        cmds.polyOptions(obj, colorShadedDisplay=True)
+        profiler.count("maya_calls")
+        store_proximity_distances(obj, mirror_target, distances, max_dimension, chunk_size, target_is_mesh=False)
+
+    symmetry_percentage = (1 - report.max_distance / max_dimension) * 100
+    print("\n################### Mirror Symmetry Result ###################")
+    print(f"{obj}: mirror plane {axis} = {plane_offset:.3f}")
+    print(f"Max asymmetry: {report.max_distance:.3f}  Mean asymmetry: {report.mean_distance:.3f}")
+    print(f"Symmetry percentage: {symmetry_percentage:.2f}%")
+    print("################### Mirror Symmetry Result ###################\n")
+    return symmetry_percentage, report
+
+@dataclass
+class ProximityResult:
+    distances: np.ndarray
+    colors: np.ndarray
+    report: DeviationReport
+
+@dataclass
+class SimilarityResult:
+    forward: ProximityResult
+    backward: ProximityResult
+    similarity_percentage: float
+    alignment: tuple = None
+    max_dimension: float = None
+
+def compute_similarity_arrays(obj1, obj2, points1, points2, max_dimension, similarity_threshold, align=False,
+                              distance_fields=None, chunk_size=None, progress=None, cancel_event=None,
+                              cache=None, cache_keys=None, with_colors=True):
+    """
+    Pure NumPy part of the two-way comparison: optional ICP, both KD-tree queries, colors and statistics.
+    Touches no Maya API, so it can run on a worker thread. With a SpatialIndexCache and the meshes'
+    cache_keys (computed on the main thread), KD-trees and pair distances are reused from disk.
+    """
+    distance_fields = distance_fields or {}
+    cache_keys = cache_keys if cache is not None else None
+    threshold_distance = max_dimension * (1 - similarity_threshold / 100)
+    with profiler.stage("tree_build"):
+        kd_tree2 = cache.get_kd_tree(cache_keys[1], points2) if cache_keys else cKDTree(points2)
+
+    alignment = None
+    if align:
+        alignment = align_points_icp(points1, points2, target_tree=kd_tree2)
+        points1 = (points1 @ alignment[0].T + alignment[1]).astype(np.float32)
+        # 模型被移动过，obj1 的距离场和缓存都不再适用
+        distance_fields = {obj2: distance_fields.get(obj2)}
+        cache_keys = None
+    with profiler.stage("tree_build"):
+        kd_tree1 = cache.get_kd_tree(cache_keys[0], points1) if cache_keys else cKDTree(points1)
+
+    results = []
+    for index, (source, target, kd_tree) in enumerate(((points1, obj2, kd_tree2), (points2, obj1, kd_tree1))):
+        distance_field = distance_fields.get(target)
+        if distance_field is None:
+            query_distances = lambda points, kd_tree=kd_tree: kd_tree.query(points)[0]
+        else:
+            query_distances = lambda points, distance_field=distance_field: distance_field.query(points, threshold_distance)
+        pair_keys = (cache_keys if index == 0 else cache_keys[::-1]) if cache_keys and distance_field is None else None
+
+        source_chunk_size = chunk_size or max(len(source), 1)
+        direction_progress = None if progress is None else (lambda fraction, index=index: progress((index + fraction) / 2))
+        accumulator = DeviationAccumulator(threshold_distance, max_dimension)
+        distances = None
+        if pair_keys:
+            with profiler.stage("cache_load"):
+                distances = cache.load_distances(*pair_keys)
+        if distances is not None:
+            for start in range(0, len(distances), source_chunk_size):
+                accumulator.update(distances[start:start + source_chunk_size])
+            if direction_progress is not None:
+                direction_progress(1.0)
+        else:
+            point_chunks = ((start, source[start:start + source_chunk_size]) for start in range(0, len(source), source_chunk_size))
+            distances = query_min_distances(point_chunks, len(source), query_distances, accumulator, direction_progress, cancel_event)
+            if pair_keys:
+                with profiler.stage("cache_store"):
+                    cache.store_distances(*pair_keys, distances)
+
+        colors = None
+        if with_colors:
+            with profiler.stage("color_map"):
+                colors = distances_to_color_array(distances, accumulator.min_distance, accumulator.max_distance, threshold_distance)
+        source_name, target_name = (obj1, obj2) if index == 0 else (obj2, obj1)
+        results.append(ProximityResult(distances, colors, accumulator.report(source_name, target_name, distance_field is not None,
+                                                                                  distances, source_chunk_size)))
+
+    similarity_percentage = min(1 - result.report.max_distance / max_dimension for result in results) * 100
+    return SimilarityResult(results[0], results[1], similarity_percentage, alignment, max_dimension)
+
+class BackgroundRunner:
+    """
+    Runs one job at a time: prepare() on the main thread (scene reads), compute() on a worker thread,
+    apply() back on the main thread through maya.utils.executeDeferred (scene writes).
+    Submitting while a job runs replaces the queued job, so repeated clicks and slider drags collapse
+    into one follow-up run with the latest settings.
+    """
+    progress_step = 0.01
+
+    def __init__(self, on_progress=None, on_busy_changed=None):
+        self.on_progress = on_progress
+        self.on_busy_changed = on_busy_changed
+        self.cancel_event = threading.Event()
+        self.running_label = None
+        self.pending_job = None
+        self._last_progress = 0.0
+        self._profile_run = None
+
+    @property
+    def busy(self):
+        return self.running_label is not None
+
+    def submit(self, label, prepare, compute, apply):
+        job = (label, prepare, compute, apply)
+        if self.busy:
+            if self.pending_job is not None:
+                print(f"Dropping queued '{self.pending_job[0]}' in favour of '{label}'")
+            self.pending_job = job
+            return
+        self._start(job)
+
+    def cancel(self):
+        self.pending_job = None
+        if self.busy:
+            self.cancel_event.set()
+            print(f"Cancelling '{self.running_label}'...")
+
+    def _start(self, job):
+        label, prepare, compute, apply = job
+        self.cancel_event.clear()
+        self.running_label = label
+        self._last_progress = 0.0
+        self._notify_busy(True)
+        self._deliver_progress(0.0)
+        # 一次 run 覆盖 prepare、后台 compute 和 apply，在 _finish 里结束
+        self._profile_run = ExitStack()
+        self._profile_run.enter_context(profiler.run(label.replace(" ", "_")))
+        try:
+            with profiler.stage("prepare"):
+                data = prepare()
+        except Exception:
+            traceback.print_exc()
+            data = None
+        if data is None:
+            self._finish()
+            return
+        threading.Thread(target=self._work, args=(job, data, list(profiler._stack)), name=f"similarity: {label}", daemon=True).start()
+
+    def _work(self, job, data, profile_stack):
+        label, _, compute, apply = job
+        try:
+            with profiler.inherit_stack(profile_stack), profiler.stage("compute"):
+                result = compute(data, self._report_progress, self.cancel_event)
+        except OperationCancelled:
+            maya.utils.executeDeferred(self._cancelled, label)
+        except Exception:
+            maya.utils.executeDeferred(self._failed, label, traceback.format_exc())
+        else:
+            maya.utils.executeDeferred(self._complete, apply, result)
 
-def visualize_object_proximity(obj1, obj2, use_binary_color, similarity_threshold):
-    distances = calculate_min_distances(obj1, obj2)
-    colors = map_distances_to_colors(distances, use_binary_color, obj1, obj2, similarity_threshold)
-    assign_vertex_colors(obj1, colors)
+    def _report_progress(self, fraction):
+        if fraction - self._last_progress >= self.progress_step or fraction >= 1.0:
+            self._last_progress = fraction
+            maya.utils.executeDeferred(self._deliver_progress, fraction)
 
-def calculate_similarity_only(obj1, obj2):
+    def _deliver_progress(self, fraction):
+        if self.on_progress is not None:
+            self.on_progress(fraction)
+
+    def _notify_busy(self, busy):
+        if self.on_busy_changed is not None:
+            self.on_busy_changed(busy)
+
+    def _complete(self, apply, result):
+        try:
+            with profiler.stage("apply"):
+                apply(result)
+        finally:
+            self._finish()
+
+    def _cancelled(self, label):
+        print(f"'{label}' was cancelled.")
+        self._finish()
+
+    def _failed(self, label, error):
+        print(f"'{label}' failed:\n{error}")
+        self._finish()
+
+    def _finish(self):
+        self.running_label = None
+        profile_run, self._profile_run = self._profile_run, None
+        if profile_run is not None:
+            profile_run.close()
+        if self.pending_job is not None:
+            job, self.pending_job = self.pending_job, None
+            self._start(job)
+        else:
+            self._deliver_progress(0.0)
+            self._notify_busy(False)
+
+background_runner = BackgroundRunner()
+
+def visualize_similarity_in_background(use_binary_color, with_visualization=True, similarity_threshold=99.5, align=False,
+                                       memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """Same as visualize_similarity, with the NumPy work on background_runner's worker thread"""
+    def prepare():
+        selected_objects = cmds.ls(selection=True)
+        if len(selected_objects) != 2:
+            print("Please select exactly two objects.")
+            return None
+        obj1, obj2 = selected_objects
+        # 缓存键要读顶点（Maya API），只能在主线程算；树和距离的读取/构建留给后台线程
+        cache = spatial_index_cache
+        if cache is not None:
+            key1, points1 = cache.get_mesh(obj1)
+            key2, points2 = cache.get_mesh(obj2)
+            cache_keys = (key1, key2)
+        else:
+            points1, points2 = get_world_points(obj1, np.float32), get_world_points(obj2, np.float32)
+            cache_keys = None
+        # 距离场是否过期要读世界矩阵，也在主线程判断
+        distance_fields = {obj: get_template_distance_field(obj) for obj in (obj1, obj2)}
+        return obj1, obj2, points1, points2, calculate_max_dimension(obj1, obj2), cache, cache_keys, distance_fields
+
+    def compute(data, progress, cancel_event):
+        obj1, obj2, points1, points2, max_dimension, cache, cache_keys, distance_fields = data
+        # 进度条至少分 50 段更新
+        chunk_size = min(chunk_size_for_memory_budget(memory_budget_mb), max(65536, max(len(points1), len(points2)) // 50))
+        return compute_similarity_arrays(obj1, obj2, points1, points2, max_dimension, similarity_threshold, align,
+                                         distance_fields, chunk_size, progress, cancel_event,
+                                         cache, cache_keys, with_visualization)
+
+    def apply(result):
+        obj1, obj2 = result.forward.report.source, result.backward.report.source
+        if result.alignment is not None:
+            report_rigid_transform(*result.alignment)
+            if with_visualization:
+                apply_rigid_transform(obj1, *result.alignment)
+
+        if with_visualization:
+            chunk_size = chunk_size_for_memory_budget(memory_budget_mb)
+            for obj, proximity in ((obj1, result.forward), (obj2, result.backward)):
+                mesh = prepare_vertex_color_set(obj)
+                for start in range(0, len(proximity.colors), chunk_size):
+                    write_vertex_colors(mesh, proximity.colors[start:start + chunk_size], start)
+                cmds.polyOptions(obj, colorShadedDisplay=True)
+                store_proximity_distances(obj, proximity.report.target, proximity.distances, result.max_dimension, chunk_size,
+                                          approximate=proximity.report.approximate)
+            last_deviation_reports[:] = [result.forward.report, result.backward.report]
+            for report in last_deviation_reports:
+                print_deviation_report(report)
+
+        print("\n################### Hausdorff Distance Result ###################")
+        print(f"Similarity percentage: {result.similarity_percentage:.2f}%")
+        print("################### Hausdorff Distance Result ###################\n")
+
+    background_runner.submit("Hausdorff similarity", prepare, compute, apply)
+
+def calculate_similarity_only(obj1, obj2, align=False):
     """Calculate Hausdorff similarity without visualization"""
-    similarity_percentage = calculate_similarity_percentage(obj1, obj2)
+    similarity_percentage = calculate_similarity_percentage(obj1, obj2, align)
     print("\n################### Hausdorff Distance Result ###################")
     print(f"Similarity percentage: {similarity_percentage:.2f}%")
     print("################### Hausdorff Distance Result ###################\n")
 
-def visualize_similarity(use_binary_color, with_visualization=True, similarity_threshold=99.5, *args):
+def visualize_similarity(use_binary_color, with_visualization=True, similarity_threshold=99.5, align=False, *args):
+    with profiler.run("visualize_similarity"):
+        _visualize_similarity(use_binary_color, with_visualization, similarity_threshold, align)
+
+def _visualize_similarity(use_binary_color, with_visualization, similarity_threshold, align):
     selected_objects = cmds.ls(selection=True)
 
     if len(selected_objects) == 2:
@@ -174,10 +1573,22 @@ def visualize_similarity(use_binary_color, with_visualization=True, similarity_t
         obj2 = selected_objects[1]
         
         if with_visualization:
-            visualize_object_proximity(obj1, obj2, use_binary_color, similarity_threshold)
-            visualize_object_proximity(obj2, obj1, use_binary_color, similarity_threshold)
-        
-        similarity_percentage = calculate_similarity_percentage(obj1, obj2)
+            # 颜色是按世界坐标计算的，所以对齐结果需要写回场景
+            if align:
+                align_objects(obj1, obj2, apply_alignment=True)
+            last_deviation_reports[:] = [
+                visualize_object_proximity(obj1, obj2, use_binary_color, similarity_threshold),
+                visualize_object_proximity(obj2, obj1, use_binary_color, similarity_threshold),
+            ]
+            for report in last_deviation_reports:
+                print_deviation_report(report)
+            # 两遍流式计算已经得到单向 Hausdorff 距离（各自的最大距离），不再重新查询
+            max_dimension = calculate_max_dimension(obj1, obj2)
+            print(f"Max dimension: {max_dimension:.3f}")
+            similarity_percentage = min((1 - report.max_distance / max_dimension) * 100 for report in last_deviation_reports)
+            print(f"Hausdorff Similarity percentage: {similarity_percentage:.2f}%")
+        else:
+            similarity_percentage = calculate_similarity_percentage(obj1, obj2, align)
         
         if not with_visualization:
             print("\n################### Hausdorff Distance Result ###################")
@@ -186,7 +1597,41 @@ def visualize_similarity(use_binary_color, with_visualization=True, similarity_t
     else:
         print("Please select exactly two objects.")
 
-def is_descendant_of(joint, ancestor):
+class JointHierarchy:
+    """
+    Parent index over every joint in the scene and the nodes directly above them, built from one ls of long names, so ancestor and
+    child-joint queries are dictionary lookups instead of a listRelatives call per step.
+    """
+    def __init__(self, joint_paths):
+        self.ancestors = {}
+        self.by_leaf_name = {}
+        # 有子骨骼的节点（可能是骨骼，也可能是作为蒙皮影响物的普通变换节点）
+        self.joints_with_children = {path.rsplit('|', 1)[0] for path in joint_paths} - {''}
+        for path in list(joint_paths) + sorted(self.joints_with_children - set(joint_paths)):
+            parts = path.strip('|').split('|')
+            self.ancestors[path] = parts[:-1]
+            self.by_leaf_name.setdefault(parts[-1], []).append(path)
+
+    @classmethod
+    def from_scene(cls):
+        return cls(cmds.ls(type='joint', long=True) or [])
+
+    def long_name(self, joint):
+        if joint in self.ancestors or joint in self.joints_with_children:
+            return joint
+        matches = [path for path in self.by_leaf_name.get(joint.split('|')[-1], []) if path.endswith('|' + joint.lstrip('|'))]
+        return matches[0] if len(matches) == 1 else None
+
+    def has_child_joints(self, joint):
+        return self.long_name(joint) in self.joints_with_children
+
+    def is_descendant_of(self, joint, ancestor):
+        path = self.long_name(joint)
+        return path is not None and ancestor.split('|')[-1] in self.ancestors[path]
+
+def is_descendant_of(joint, ancestor, hierarchy=None):
+    if hierarchy is not None:
+        return hierarchy.is_descendant_of(joint, ancestor)
     while joint:
         parent = cmds.listRelatives(joint, parent=True)
         if parent:
@@ -197,33 +1642,52 @@ def is_descendant_of(joint, ancestor):
             break
     return False
 
+def find_weight_driver_joints(blend_shape):
+    """
+    Joints driving blend_shape's .weight plugs, walking upstream through non-DAG nodes
+    (anim curves, unit conversions, expressions...) and stopping at the first DAG node on each path
+    """
+    driver_joints = set()
+    visited = set()
+    frontier = cmds.listConnections(f"{blend_shape}.weight", source=True, destination=False) or []
+    while frontier:
+        frontier = [node for node in set(frontier) if node not in visited]
+        visited.update(frontier)
+        driver_joints.update(cmds.ls(frontier, type='joint', long=True) or [])
+        utility_nodes = set(frontier) - set(cmds.ls(frontier, type='dagNode') or [])
+        frontier = (cmds.listConnections(list(utility_nodes), source=True, destination=False) or []) if utility_nodes else []
+    return driver_joints
+
+def find_deformer_influences(objects):
+    """
+    skinClusters/blendShapes in the objects' history, the skin influences of each skinCluster
+    and the joints driving each blendShape's weights
+    """
+    shapes = cmds.listRelatives(objects, shapes=True, noIntermediate=True, fullPath=True) or []
+    history = (cmds.listHistory(shapes) or []) if shapes else []
+    skin_clusters = cmds.ls(history, type='skinCluster') or []
+    blend_shapes = cmds.ls(history, type='blendShape') or []
+
+    influences = set()
+    for skin_cluster in skin_clusters:
+        influences.update(cmds.ls(cmds.skinCluster(skin_cluster, query=True, influence=True) or [], long=True) or [])
+    for blend_shape in blend_shapes:
+        influences.update(find_weight_driver_joints(blend_shape))
+    return skin_clusters + blend_shapes, sorted(influences)
+
 def print_related_joint_names():
     selected_obj = cmds.ls(selection=True, type='transform')
     
     if selected_obj:
-        related_joints = []
-        skin_cluster = 'skinCluster1'
-        if cmds.objExists(skin_cluster):
-            influence_joints = cmds.skinCluster(skin_cluster, query=True, influence=True)
-            related_joints.extend(influence_joints)
-        
-        blend_shape = 'BODY_BS'
-        if cmds.objExists(blend_shape):
-            blend_targets = cmds.blendShape(blend_shape, query=True, target=True)
-            for target in blend_targets:
-                target_joints = cmds.listConnections(target, type='joint')
-                if target_joints:
-                    related_joints.extend(target_joints)
+        deformers, related_joints = find_deformer_influences(selected_obj)
+        print(f"Deformers: {', '.join(deformers) if deformers else 'none'}")
         
-        joints_with_children = []
-        for joint in related_joints:
-            child_joints = cmds.listRelatives(joint, children=True, type='joint')
-            if child_joints:
-                joints_with_children.append(joint)
+        hierarchy = JointHierarchy.from_scene()
+        joints_with_children = sorted({joint.split('|')[-1] for joint in related_joints if hierarchy.has_child_joints(joint)})
         
         if joints_with_children:
             print("Related Joint Names with Child Joints:")
-            for joint in set(joints_with_children):
+            for joint in joints_with_children:
                 print(joint)
         else:
             print("No related joints with child joints found for the selected object.")
@@ -250,24 +1714,41 @@ def boolean_difference(obj1, obj2):
     print("Boolean Difference operation completed.")
     return boolean_result[0]
 
-def get_longest_edge_loop(obj):
+@profiler.timed()
+def get_longest_edge_loop(obj, show_progress=False):
+    """With show_progress, runs under an interruptible progress window; Esc raises OperationCancelled"""
     edges = cmds.ls(cmds.polyListComponentConversion(obj, toEdge=True), flatten=True)
     edge_loops = []
-    for edge in edges:
-        cmds.select(edge, replace=True)
-        cmds.polySelectSp(loop=True)
-        edge_loop = cmds.ls(selection=True, flatten=True)
-        if edge_loop not in edge_loops:
-            edge_loops.append(edge_loop)
+    seen_loops = set()
+    if show_progress:
+        cmds.progressWindow(title="Surface Length", status=f"Searching edge loops of {obj}", progress=0,
+                            maxValue=max(len(edges), 1), isInterruptable=True)
+    try:
+        for index, edge in enumerate(edges):
+            if show_progress and index % 100 == 0:
+                if cmds.progressWindow(query=True, isCancelled=True):
+                    raise OperationCancelled()
+                cmds.progressWindow(edit=True, progress=index)
+            cmds.select(edge, replace=True)
+            cmds.polySelectSp(loop=True)
+            edge_loop = cmds.ls(selection=True, flatten=True)
+            profiler.count("maya_calls", 3)
+            # 用集合判重，避免对已找到的循环做线性比较
+            if tuple(edge_loop) not in seen_loops:
+                seen_loops.add(tuple(edge_loop))
+                edge_loops.append(edge_loop)
+    finally:
+        if show_progress:
+            cmds.progressWindow(endProgress=True)
 
     longest_edge_loop = max(edge_loops, key=len)
     print(f"Longest edge loop: {longest_edge_loop}")
     cmds.select(clear=True)
     return longest_edge_loop
 
-def calculate_surface_length(obj, plane_obj):
+def calculate_surface_length(obj, plane_obj, show_progress=False):
     boolean_result = boolean_difference(obj, plane_obj)
-    longest_edge_loop = get_longest_edge_loop(boolean_result)
+    longest_edge_loop = get_longest_edge_loop(boolean_result, show_progress)
     surface_length = calculate_total_edge_length(longest_edge_loop)   
     return surface_length
 
@@ -292,8 +1773,12 @@ def calculate_surface_length_similarity(*args):
         print(f"obj_a: {object_a}, obj_b: {object_b}")
         merge_vertices(object_a)
         merge_vertices(object_b)
-        surface_length1 = calculate_surface_length(object_a, object_plane)
-        surface_length2 = calculate_surface_length(object_b, object_plane)
+        try:
+            surface_length1 = calculate_surface_length(object_a, object_plane, show_progress=True)
+            surface_length2 = calculate_surface_length(object_b, object_plane, show_progress=True)
+        except OperationCancelled:
+            print("Surface length similarity was cancelled.")
+            return
         print(f"surface_length1: {surface_length1}, surface_length2: {object_b}")
 
         print("\n################### Surface Length Result ###################")
@@ -310,7 +1795,11 @@ def measure_circumference(*args):
     if len(selected_objects) == 2:
         object_a, object_plane = selected_objects
         merge_vertices(object_a)
-        surface_length1 = calculate_surface_length(object_a, object_plane)
+        try:
+            surface_length1 = calculate_surface_length(object_a, object_plane, show_progress=True)
+        except OperationCancelled:
+            print("Measure circumference was cancelled.")
+            return
 
         print("\n################### Surface Length Result ###################")
         print(f"Surface length of {object_a}: {surface_length1}")  
@@ -357,7 +1846,83 @@ def get_cross_section_perimeter(mesh, plane_transform):
 
     return perimeter
 
+def on_click_export_deviation_reports(*args):
+    if not last_deviation_reports:
+        cmds.warning("No deviation report yet. Run a Hausdorff color comparison first.")
+        return
+
+    file_path = cmds.fileDialog2(fileFilter="JSON Files (*.json)", dialogStyle=2, fileMode=0)
+    if file_path:
+        export_deviation_reports(last_deviation_reports, file_path[0])
+
+def on_click_build_template_field(*args):
+    selected_objects = cmds.ls(selection=True)
+    if len(selected_objects) != 1:
+        cmds.warning("Please select exactly one reference object.")
+        return
+
+    reference = selected_objects[0]
+    template_distance_fields[reference] = build_template_distance_field(reference)
+    file_path = cmds.fileDialog2(fileFilter="Distance Field (*.npz)", dialogStyle=2, fileMode=0)
+    if file_path:
+        template_distance_fields[reference].save(file_path[0])
+
+def on_click_load_template_field(*args):
+    file_path = cmds.fileDialog2(fileFilter="Distance Field (*.npz)", dialogStyle=2, fileMode=1)
+    if file_path:
+        distance_field = TemplateDistanceField.load(file_path[0])
+        template_distance_fields[distance_field.name] = distance_field
+        print(f"Loaded distance field for {distance_field.name}")
+
+def on_click_build_retrieval_index(*args):
+    global shape_retrieval_index
+    with profiler.run("build_retrieval_index"):
+        shape_retrieval_index = build_shape_retrieval_index()
+    if not shape_retrieval_index.names:
+        cmds.warning("No b_* scan models found in the scene.")
+        return
+
+    print(f"Indexed {len(shape_retrieval_index.names)} scans")
+    file_path = cmds.fileDialog2(fileFilter="Retrieval Index (*.npz)", dialogStyle=2, fileMode=0)
+    if file_path:
+        shape_retrieval_index.save(file_path[0])
+
+def on_click_load_retrieval_index(*args):
+    global shape_retrieval_index
+    file_path = cmds.fileDialog2(fileFilter="Retrieval Index (*.npz)", dialogStyle=2, fileMode=1)
+    if file_path:
+        shape_retrieval_index = ShapeRetrievalIndex.load(file_path[0])
+        print(f"Loaded retrieval index of {len(shape_retrieval_index.names)} scans")
+
+def on_click_find_similar_scans(align=False, top_k=5):
+    selected_objects = cmds.ls(selection=True)
+    if len(selected_objects) != 1:
+        cmds.warning("Please select exactly one scan to look up.")
+        return
+    if not shape_retrieval_index.names:
+        cmds.warning("The retrieval index is empty. Build or load one first.")
+        return
+
+    with profiler.run("find_similar_scans"):
+        matches = shape_retrieval_index.query(selected_objects[0], top_k, align)
+    print_retrieval_matches(selected_objects[0], matches)
+
+def on_click_mirror_symmetry(axis="X", similarity_threshold=99.5):
+    selected_objects = cmds.ls(selection=True)
+    if len(selected_objects) != 1:
+        cmds.warning("Please select exactly one object.")
+        return
+
+    with profiler.run("mirror_symmetry"):
+        _, report = visualize_symmetry(selected_objects[0], axis, similarity_threshold)
+    last_deviation_reports[:] = [report]
+    print_deviation_report(report)
+
 def on_click_reset_color(*args):
+    with profiler.run("reset_color"):
+        _reset_color()
+
+def _reset_color():
     selected_objects = cmds.ls(selection=True)
     
     if not selected_objects:
@@ -373,33 +1938,12 @@ def on_click_reset_color(*args):
                 cmds.warning(f"{obj} is not a mesh.")
                 continue
         
-        start_time = time.time()
-
-        shape_node = cmds.listRelatives(obj, shapes=True)[0]
-        sel_list = om.MSelectionList()
-        sel_list.add(shape_node)
-        dag_path = sel_list.getDagPath(0)
-        mesh = om.MFnMesh(dag_path)
-
-        color_set = 'vertexColorSet'
-        vertex_color_representation = om.MFnMesh.kRGB
-        if color_set not in mesh.getColorSetNames():
-            mesh.createColorSet(color_set, vertex_color_representation)
-        mesh.setCurrentColorSetName(color_set)
-
-        vertex_count = mesh.numVertices
-        np_colors = np.array([default_color] * vertex_count, dtype=np.float32)
-        color_array = om.MColorArray()
-        for color in np_colors:
-            color_array.append(om.MColor(color.tolist()))
-
-        vertex_indices = list(range(vertex_count))
-        mesh.setVertexColors(color_array, vertex_indices)
-        cmds.polyOptions(obj, colorShadedDisplay=True)
-
-        end_time = time.time()
-        execution_time = end_time - start_time
-        print(f"Setting colors for {obj} took: {execution_time:.5f} seconds")
+        with profiler.stage("reset_color"):
+            mesh = prepare_vertex_color_set(obj)
+            np_colors = np.tile(np.array(default_color, dtype=np.float32), (mesh.numVertices, 1))
+            write_vertex_colors(mesh, np_colors)
+            cmds.polyOptions(obj, colorShadedDisplay=True)
+            profiler.count("maya_calls")
 
 if __name__ == '__main__':
     print("################### Similarity Visualizer Start ###################")
@@ -410,23 +1954,51 @@ if __name__ == '__main__':
     
     def run_hausdorff_similarity_palette(*args):
         threshold = cmds.floatSliderGrp(similarity_threshold_slider, query=True, value=True)
-        visualize_similarity(False, True, threshold)
+        align = cmds.checkBox(align_checkbox, query=True, value=True)
+        if cmds.checkBox(background_checkbox, query=True, value=True):
+            visualize_similarity_in_background(False, True, threshold, align)
+        else:
+            visualize_similarity(False, True, threshold, align)
 
     def run_hausdorff_similarity_binary(*args):
         threshold = cmds.floatSliderGrp(similarity_threshold_slider, query=True, value=True)
-        visualize_similarity(True, True, threshold)
+        align = cmds.checkBox(align_checkbox, query=True, value=True)
+        if cmds.checkBox(background_checkbox, query=True, value=True):
+            visualize_similarity_in_background(True, True, threshold, align)
+        else:
+            visualize_similarity(True, True, threshold, align)
 
     def run_hausdorff_similarity_no_color(*args):
         threshold = cmds.floatSliderGrp(similarity_threshold_slider, query=True, value=True)
-        visualize_similarity(False, False, threshold)
+        align = cmds.checkBox(align_checkbox, query=True, value=True)
+        if cmds.checkBox(background_checkbox, query=True, value=True):
+            visualize_similarity_in_background(False, False, threshold, align)
+        else:
+            visualize_similarity(False, False, threshold, align)
         
+    def recolor_or_run_hausdorff(*args):
+        # 选中模型已有存储的距离时只重新着色，不再查询另一个模型
+        selected_objects = cmds.ls(selection=True)
+        if len(selected_objects) in (1, 2) and stored_distances_available(selected_objects):
+            threshold = cmds.floatSliderGrp(similarity_threshold_slider, query=True, value=True)
+            with profiler.run("recolor"):
+                last_deviation_reports[:] = [recolor_from_stored_distances(obj, threshold) for obj in selected_objects]
+        else:
+            run_hausdorff_similarity_palette()
+
+    def update_spatial_index_cache(*args):
+        if not cmds.checkBox(cache_checkbox, query=True, value=True):
+            disable_spatial_index_cache()
+        elif spatial_index_cache is None:
+            enable_spatial_index_cache()
+
     def increment_threshold(*args):
         current_value = cmds.floatSliderGrp(similarity_threshold_slider, query=True, value=True)
         step = cmds.floatSliderGrp(similarity_threshold_slider, query=True, step=True)
         max_value = cmds.floatSliderGrp(similarity_threshold_slider, query=True, maxValue=True)
         new_value = min(current_value + step, max_value)
         cmds.floatSliderGrp(similarity_threshold_slider, edit=True, value=new_value)
-        run_hausdorff_similarity_palette()
+        recolor_or_run_hausdorff()
         
     def decrement_threshold(*args):
         current_value = cmds.floatSliderGrp(similarity_threshold_slider, query=True, value=True)
@@ -434,7 +2006,7 @@ if __name__ == '__main__':
         min_value = cmds.floatSliderGrp(similarity_threshold_slider, query=True, minValue=True)
         new_value = max(current_value - step, min_value)
         cmds.floatSliderGrp(similarity_threshold_slider, edit=True, value=new_value)
-        run_hausdorff_similarity_palette()
+        recolor_or_run_hausdorff()
 
     # 创建一个水平布局来放置滑动条和按钮
     slider_row = cmds.rowLayout(numberOfColumns=2, adjustableColumn=1, columnWidth2=(280, 50), columnAttach=[(1, 'both', 0), (2, 'right', 0)])
@@ -450,8 +2022,8 @@ if __name__ == '__main__':
         step=0.01,
         columnWidth3=(110, 50, 120),
         adjustableColumn=3,
-        dragCommand=run_hausdorff_similarity_palette,
-        changeCommand=run_hausdorff_similarity_palette
+        dragCommand=recolor_or_run_hausdorff,
+        changeCommand=recolor_or_run_hausdorff
     )
     
     # 在水平布局的第二列创建一个新的垂直布局来放置增减按钮
@@ -465,16 +2037,49 @@ if __name__ == '__main__':
     # 添加一个小间隔
     cmds.separator(height=5, style='none')
     
+    align_checkbox = cmds.checkBox(label="Pre-align with ICP", value=False)
+    background_checkbox = cmds.checkBox(label="Run Hausdorff comparisons in background", value=True)
+    cache_checkbox = cmds.checkBox(label=f"Cache spatial indexes in {SPATIAL_INDEX_CACHE_DIR}", value=True,
+                                   changeCommand=update_spatial_index_cache)
+    update_spatial_index_cache()
+    cmds.checkBox(label=f"Profile runs (JSON traces in {PROFILE_TRACE_DIR})", value=profiler.enabled,
+                  changeCommand=lambda value: setattr(profiler, "enabled", bool(value)))
+    cmds.checkBox(label="Trace peak Python memory while profiling (slows timings)", value=profiler.trace_memory,
+                  changeCommand=lambda value: setattr(profiler, "trace_memory", bool(value)))
+    
+    # 后台计算的进度条和取消按钮
+    progress_row = cmds.rowLayout(numberOfColumns=2, adjustableColumn=1)
+    progress_bar = cmds.progressBar(parent=progress_row, maxValue=100, height=18)
+    cancel_button = cmds.button(parent=progress_row, label="Cancel", width=60, enable=False, command=lambda *args: background_runner.cancel())
+    cmds.setParent(main_layout)
+    background_runner.on_progress = lambda fraction: cmds.progressBar(progress_bar, edit=True, progress=int(fraction * 100))
+    background_runner.on_busy_changed = lambda busy: cmds.button(cancel_button, edit=True, enable=busy)
+    
     # 创建其他按钮
     cmds.button(label="Hausdorff Similarity Palette Color", command=run_hausdorff_similarity_palette)
     cmds.button(label="Hausdorff Similarity Binary Color", command=run_hausdorff_similarity_binary)
     cmds.button(label="Hausdorff Similarity No Color", command=run_hausdorff_similarity_no_color)
     cmds.button(label="Surface Length Similarity", command=calculate_surface_length_similarity)
+    # 单个模型的镜像对称：按所选轴、过质心的平面
+    symmetry_row = cmds.rowLayout(numberOfColumns=2, adjustableColumn=2)
+    symmetry_axis_menu = cmds.optionMenu(parent=symmetry_row, label="Mirror Axis")
+    for axis_label in ("X", "Y", "Z"):
+        cmds.menuItem(label=axis_label)
+    cmds.button(parent=symmetry_row, label="Mirror Symmetry",
+                command=lambda *args: on_click_mirror_symmetry(cmds.optionMenu(symmetry_axis_menu, query=True, value=True),
+                                                               cmds.floatSliderGrp(similarity_threshold_slider, query=True, value=True)))
+    cmds.setParent(main_layout)
     cmds.button(label="Measure Circumference", command=measure_circumference)
     cmds.button(label="Create plane", command=create_polyplane)
     cmds.button(label="Calculate selected edges length", command=on_click_calculate_selected_edge_length)
     cmds.button(label="Calculate mesh's max edge loop length", command=on_click_calculate_mesh_max_edge_loop_length)
     cmds.button(label="Reset Color", command=on_click_reset_color)
+    cmds.button(label="Export Deviation Report", command=on_click_export_deviation_reports)
+    cmds.button(label="Precompute Template Distance Field", command=on_click_build_template_field)
+    cmds.button(label="Load Template Distance Field", command=on_click_load_template_field)
+    cmds.button(label="Build Scan Retrieval Index", command=on_click_build_retrieval_index)
+    cmds.button(label="Load Scan Retrieval Index", command=on_click_load_retrieval_index)
+    cmds.button(label="Find Most Similar Scans", command=lambda *args: on_click_find_similar_scans(cmds.checkBox(align_checkbox, query=True, value=True)))
 
     cmds.showWindow(window)
     print("################### Similarity Visualizer End  ###################")
\ No newline at end of file
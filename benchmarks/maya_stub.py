@@ -0,0 +1,382 @@
+"""
+Local stand-in for maya.cmds / maya.api.OpenMaya / maya.utils, just large enough to run SimilarityVisualizer outside Maya.
+
+Meshes are tube grids (rings x segments, closed around each ring) as produced by synthetic_meshes.py.
+Point access goes through per-index MPoint objects like the real MPointArray, so extraction costs stay
+representative. Call install() before importing SimilarityVisualizer.
+"""
+import queue
+import re
+import sys
+import types
+import numpy as np
+
+
+class StubMesh:
+    def __init__(self, name, points, rings, segments):
+        self.name = name
+        self.points = np.asarray(points, dtype=np.float64)
+        self.rings = rings
+        self.segments = segments
+        self.color_sets = {}
+        self.current_color_set = None
+        self.attributes = {}
+        self.matrix = np.eye(4)
+
+    @property
+    def colors(self):
+        return self.color_sets.get("vertexColorSet")
+
+    @property
+    def ring_edge_count(self):
+        return self.rings * self.segments
+
+    @property
+    def edge_count(self):
+        return self.ring_edge_count + (self.rings - 1) * self.segments
+
+    def edge_vertices(self, edge):
+        # 先是每一圈的环向边，再是相邻两圈之间的纵向边
+        if edge < self.ring_edge_count:
+            ring, segment = divmod(edge, self.segments)
+            return ring * self.segments + segment, ring * self.segments + (segment + 1) % self.segments
+        ring, segment = divmod(edge - self.ring_edge_count, self.segments)
+        return ring * self.segments + segment, (ring + 1) * self.segments + segment
+
+    def edge_loop(self, edge):
+        if edge < self.ring_edge_count:
+            ring = edge // self.segments
+            return list(range(ring * self.segments, (ring + 1) * self.segments))
+        segment = (edge - self.ring_edge_count) % self.segments
+        return [self.ring_edge_count + ring * self.segments + segment for ring in range(self.rings - 1)]
+
+
+scene = {}
+active_selection = []
+curves = {}
+scene_file = {"name": ""}
+
+
+def add_mesh(name, points, rings, segments):
+    scene[name] = StubMesh(name, points, rings, segments)
+    return name
+
+
+def clear_scene():
+    scene.clear()
+    curves.clear()
+    scene_file["name"] = ""
+    del active_selection[:]
+
+
+def _node_name(name):
+    name = name.split(".")[0]
+    return name[:-len("Shape")] if name.endswith("Shape") and name[:-len("Shape")] in scene else name
+
+
+def _expand_components(items):
+    expanded = []
+    for item in items:
+        match = re.match(r"(.+)\.e\[(\d+)(?::(\d+))?\]$", item)
+        if match:
+            first = int(match.group(2))
+            last = int(match.group(3) or first)
+            expanded.extend(f"{match.group(1)}.e[{edge}]" for edge in range(first, last + 1))
+        else:
+            expanded.append(item)
+    return expanded
+
+
+def _edge_of(component):
+    name, edge = re.match(r"(.+)\.e\[(\d+)\]$", component).groups()
+    return scene[name], int(edge)
+
+
+def _rotation_matrix(rotation):
+    x, y, z = np.radians(rotation)
+    rx = np.array([[1, 0, 0], [0, np.cos(x), -np.sin(x)], [0, np.sin(x), np.cos(x)]])
+    ry = np.array([[np.cos(y), 0, np.sin(y)], [0, 1, 0], [-np.sin(y), 0, np.cos(y)]])
+    rz = np.array([[np.cos(z), -np.sin(z), 0], [np.sin(z), np.cos(z), 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+
+# ---------------------------------------------------------------- maya.cmds
+
+def listRelatives(obj, shapes=False, **kwargs):
+    return [f"{_node_name(obj)}Shape"] if shapes else []
+
+
+def exactWorldBoundingBox(obj):
+    points = scene[_node_name(obj)].points
+    return points.min(axis=0).tolist() + points.max(axis=0).tolist()
+
+
+def polyOptions(*args, **kwargs):
+    pass
+
+
+def ls(*args, selection=False, flatten=False, **kwargs):
+    items = list(active_selection) if selection else [item for arg in args for item in (arg if isinstance(arg, list) else [arg])]
+    return _expand_components(items) if flatten else items
+
+
+def select(items=None, replace=False, clear=False, **kwargs):
+    if clear:
+        del active_selection[:]
+        return
+    items = items if isinstance(items, list) else [items]
+    active_selection[:] = _expand_components(items)
+
+
+def polyListComponentConversion(obj, toEdge=False, **kwargs):
+    mesh = scene[_node_name(obj[0] if isinstance(obj, list) else obj)]
+    return [f"{mesh.name}.e[0:{mesh.edge_count - 1}]"]
+
+
+def polySelectSp(*args, loop=False, q=False, **kwargs):
+    if q:
+        return True
+    mesh, edge = _edge_of(active_selection[0])
+    active_selection[:] = [f"{mesh.name}.e[{loop_edge}]" for loop_edge in mesh.edge_loop(edge)]
+
+
+def arclen(edge):
+    mesh, edge = _edge_of(edge)
+    start, end = mesh.edge_vertices(edge)
+    return float(np.linalg.norm(mesh.points[end] - mesh.points[start]))
+
+
+def xform(obj, query=False, q=False, worldSpace=False, ws=False, matrix=None, rp=False, ro=False, **kwargs):
+    if query or q:
+        if rp:
+            return [0.0, 0.0, 0.0]
+        if ro:
+            return [0.0, 0.0, 0.0]
+        mesh = scene.get(_node_name(obj))
+        return (mesh.matrix if mesh is not None else np.eye(4)).flatten().tolist()
+    if matrix is not None:
+        # 矩阵是绝对值：点先变回物体空间再应用新矩阵
+        mesh = scene[_node_name(obj)]
+        transform = np.array(matrix).reshape(4, 4)
+        relative = np.linalg.inv(mesh.matrix) @ transform
+        mesh.points = mesh.points @ relative[:3, :3] + relative[3, :3]
+        mesh.matrix = transform
+
+
+def polyCut(mesh, ws=True, ro=(0.0, 0.0, 0.0), pc=(0.0, 0.0, 0.0), **kwargs):
+    """Intersect the vertical (ring-to-ring) edges with the cut plane; the plane's normal is +Y rotated by ro"""
+    mesh = scene[_node_name(mesh)]
+    normal = _rotation_matrix(ro) @ np.array([0.0, 1.0, 0.0])
+    heights = (mesh.points - np.asarray(pc)) @ normal
+    grid = heights.reshape(mesh.rings, mesh.segments)
+    crossing_rings = np.argmax((grid[:-1] <= 0) & (grid[1:] > 0), axis=0)
+    segments = np.arange(mesh.segments)
+    crossing = ((grid[:-1] <= 0) & (grid[1:] > 0))[crossing_rings, segments]
+    if not np.any(crossing):
+        return []
+
+    lower = crossing_rings * mesh.segments + segments
+    upper = lower + mesh.segments
+    t = (-heights[lower] / (heights[upper] - heights[lower]))[:, None]
+    section = (mesh.points[lower] + (mesh.points[upper] - mesh.points[lower]) * t)[crossing]
+    curve_name = f"{mesh.name}_cutCurve{len(curves) + 1}"
+    curves[curve_name] = float(np.linalg.norm(np.roll(section, -1, axis=0) - section, axis=1).sum())
+    active_selection[:] = [curve_name]
+    return [f"{mesh.name}.e[{edge}]" for edge in range(int(crossing.sum()))]
+
+
+def polyToCurve(ch=False, **kwargs):
+    return list(active_selection)
+
+
+def delete(*items, **kwargs):
+    for item in items:
+        for name in item if isinstance(item, list) else [item]:
+            curves.pop(name, None)
+            scene.pop(name, None)
+
+
+def file(*args, query=False, sceneName=False, **kwargs):
+    if query and sceneName:
+        return scene_file["name"]
+
+
+def objExists(name):
+    return _node_name(name) in scene
+
+
+def attributeQuery(name, node=None, exists=False, **kwargs):
+    return name in scene[_node_name(node)].attributes
+
+
+def addAttr(obj, longName=None, **kwargs):
+    scene[_node_name(obj)].attributes.setdefault(longName, None)
+
+
+def setAttr(plug, value, **kwargs):
+    obj, name = plug.split(".", 1)
+    scene[_node_name(obj)].attributes[name] = value
+
+
+def getAttr(plug, **kwargs):
+    obj, name = plug.split(".", 1)
+    return scene[_node_name(obj)].attributes[name]
+
+
+def warning(message):
+    print(f"Warning: {message}")
+
+
+def progressWindow(*args, query=False, isCancelled=False, **kwargs):
+    return False if query else None
+
+
+# ---------------------------------------------------------------- maya.utils
+
+deferred_calls = queue.Queue()
+
+
+def executeDeferred(func, *args):
+    """Queued like Maya's idle queue; run them on the calling (main) thread with process_deferred()"""
+    deferred_calls.put((func, args))
+
+
+def process_deferred(timeout=None):
+    """Run queued deferred calls until the queue stays empty for timeout seconds"""
+    while True:
+        try:
+            func, args = deferred_calls.get(timeout=timeout)
+        except queue.Empty:
+            return
+        func(*args)
+
+
+# ---------------------------------------------------------------- maya.api.OpenMaya
+
+class MPoint:
+    __slots__ = ("x", "y", "z", "w")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0, w=1.0):
+        self.x, self.y, self.z, self.w = x, y, z, w
+
+
+class MPointArray:
+    def __init__(self, points):
+        self._points = points
+
+    def __len__(self):
+        return len(self._points)
+
+    def __getitem__(self, index):
+        x, y, z = self._points[index].tolist()
+        return MPoint(x, y, z)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+
+class MColorArray:
+    def __init__(self, colors=()):
+        self.values = np.asarray(colors, dtype=np.float32).reshape(-1, len(colors[0]) if len(colors) else 3)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return MColor(self.values[index].tolist())
+
+
+class MColor(tuple):
+    r = property(lambda self: self[0])
+    g = property(lambda self: self[1])
+    b = property(lambda self: self[2])
+    a = property(lambda self: self[3] if len(self) > 3 else 1.0)
+
+
+class MSpace:
+    kWorld = 4
+
+
+class MSelectionList:
+    def __init__(self):
+        self._items = []
+
+    def add(self, name):
+        self._items.append(_node_name(name))
+
+    def getDagPath(self, index):
+        return self._items[index]
+
+
+class MGlobal:
+    @staticmethod
+    def getSelectionListByName(name):
+        sel_list = MSelectionList()
+        sel_list.add(name)
+        return sel_list
+
+
+class MFnMesh:
+    kRGB = 3
+    kRGBA = 4
+
+    def __init__(self, dag_path):
+        self._mesh = scene[dag_path]
+
+    @property
+    def numVertices(self):
+        return len(self._mesh.points)
+
+    def getPoints(self, space=None):
+        return MPointArray(self._mesh.points)
+
+    def getColorSetNames(self):
+        return list(self._mesh.color_sets)
+
+    def createColorSet(self, name, *args, **kwargs):
+        self._mesh.color_sets.setdefault(name, None)
+
+    def setCurrentColorSetName(self, name):
+        self._mesh.current_color_set = name
+
+    def setVertexColors(self, colors, indices):
+        color_set = self._mesh.current_color_set
+        if self._mesh.color_sets.get(color_set) is None:
+            self._mesh.color_sets[color_set] = np.zeros((self.numVertices, colors.values.shape[1]), dtype=np.float32)
+        self._mesh.color_sets[color_set][np.asarray(indices)] = colors.values
+
+    def getVertexColors(self, colorSet=None):
+        return MColorArray(self._mesh.color_sets[colorSet or self._mesh.current_color_set])
+
+
+class MFnNurbsCurve:
+    def __init__(self, dag_path):
+        self._length = curves[dag_path]
+
+    def length(self):
+        return self._length
+
+
+def install():
+    """Register the stub as maya, maya.cmds, maya.api and maya.api.OpenMaya"""
+    this_module = sys.modules[__name__]
+    maya = types.ModuleType("maya")
+    cmds = types.ModuleType("maya.cmds")
+    api = types.ModuleType("maya.api")
+    utils = types.ModuleType("maya.utils")
+    open_maya = types.ModuleType("maya.api.OpenMaya")
+
+    for name in ("listRelatives", "exactWorldBoundingBox", "polyOptions", "ls", "select", "polyListComponentConversion",
+                 "polySelectSp", "arclen", "xform", "polyCut", "polyToCurve", "delete", "file", "objExists", "attributeQuery", "addAttr",
+                 "setAttr", "getAttr", "warning", "progressWindow"):
+        setattr(cmds, name, getattr(this_module, name))
+    for name in ("MPoint", "MPointArray", "MColorArray", "MColor", "MSpace", "MSelectionList", "MGlobal", "MFnMesh", "MFnNurbsCurve"):
+        setattr(open_maya, name, getattr(this_module, name))
+
+    utils.executeDeferred = executeDeferred
+
+    maya.cmds = cmds
+    maya.api = api
+    maya.utils = utils
+    api.OpenMaya = open_maya
+    sys.modules.update({"maya": maya, "maya.cmds": cmds, "maya.api": api, "maya.api.OpenMaya": open_maya, "maya.utils": utils})
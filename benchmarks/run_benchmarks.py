@@ -0,0 +1,163 @@
+"""
+Benchmarks for SimilarityVisualizer.py outside Maya, against the stub in maya_stub.py.
+
+    python benchmarks/run_benchmarks.py --sizes 2k,10k,100k,1M --save results.json
+    python benchmarks/run_benchmarks.py --sizes 2k,10k,100k,1M --baseline results.json
+
+Each stage runs once under tracemalloc for its peak Python memory, then is timed (best of --repeat runs).
+With --baseline, any stage slower than the baseline by more than --tolerance, or whose peak memory grew by more
+than --memory-tolerance, is reported and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import maya_stub
+maya_stub.install()
+
+import SimilarityVisualizer as sv
+from synthetic_meshes import make_pair
+
+STAGES = ["extraction", "hausdorff", "color_mapping", "color_write", "proximity_pipeline", "cross_section", "edge_loop_search"]
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def measure(func, repeat):
+    """Peak traced memory of one run, then the best wall time over repeat untraced runs"""
+    tracemalloc.start()
+    func()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best, peak_memory
+
+
+def run_size(shape, vertex_count, args):
+    maya_stub.clear_scene()
+    reference, candidate, rings, segments = make_pair(shape, vertex_count, args.noise, (args.offset, 0.0, 0.0), args.seed)
+    obj1 = maya_stub.add_mesh("candidate", candidate, rings, segments)
+    obj2 = maya_stub.add_mesh("reference", reference, rings, segments)
+    actual_count = len(candidate)
+
+    distances = sv.calculate_min_distances(obj1, obj2)
+    colors = sv.map_distances_to_colors(distances, False, obj1, obj2, args.threshold)
+
+    stages = {
+        "extraction": lambda: sv.get_world_points(obj1, np.float32),
+        "hausdorff": lambda: sv.calculate_hausdorff_distance(obj1, obj2),
+        "color_mapping": lambda: sv.map_distances_to_colors(distances, False, obj1, obj2, args.threshold),
+        "color_write": lambda: sv.assign_vertex_colors(obj1, colors),
+        "proximity_pipeline": lambda: sv.visualize_object_proximity(obj1, obj2, False, args.threshold, args.memory_budget_mb),
+        "cross_section": lambda: sv.get_cross_section_perimeter(obj1, "plane"),
+        "edge_loop_search": lambda: sv.get_longest_edge_loop(obj1),
+    }
+
+    results = {}
+    for stage in args.stages:
+        if stage == "edge_loop_search" and actual_count > args.edge_loop_max_vertices:
+            continue
+        seconds, peak_memory = measure(stages[stage], args.repeat)
+        results[f"{stage}@{vertex_count}"] = {
+            "stage": stage,
+            "vertices": actual_count,
+            "seconds": seconds,
+            "vertices_per_second": actual_count / seconds if seconds > 0 else float("inf"),
+            "peak_memory_mb": peak_memory / (1024 * 1024),
+        }
+        print(f"{stage:>20s} {actual_count:>9d} verts  {seconds:9.4f} s  {actual_count / max(seconds, 1e-12):>14,.0f} verts/s  {peak_memory / (1024 * 1024):8.1f} MB")
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance, memory_tolerance):
+    regressions = []
+    print("\n################### Baseline comparison ###################")
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["seconds"] / max(baseline[key]["seconds"], 1e-12)
+        # 很小的内存峰值波动大，按至少 1 MB 的基线计算比例
+        memory_ratio = max(result["peak_memory_mb"], 1.0) / max(baseline[key]["peak_memory_mb"], 1.0)
+        flags = []
+        if ratio > 1 + tolerance:
+            flags.append("REGRESSION")
+        if memory_ratio > 1 + memory_tolerance:
+            flags.append("MEMORY REGRESSION")
+        print(f"{key:>32s}  {baseline[key]['seconds']:9.4f} s -> {result['seconds']:9.4f} s  x{ratio:5.2f}  "
+              f"{baseline[key]['peak_memory_mb']:8.1f} MB -> {result['peak_memory_mb']:8.1f} MB  x{memory_ratio:5.2f}  {' '.join(flags)}")
+        if flags:
+            regressions.append(key)
+    print("################### Baseline comparison ###################\n")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="2k,10k,100k,1M", help="comma separated vertex counts, e.g. 2k,10k,100k,1M,5M")
+    parser.add_argument("--shape", choices=["body", "sphere"], default="body")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma separated subset of " + ",".join(STAGES))
+    parser.add_argument("--noise", type=float, default=0.2, help="candidate vertex noise in cm")
+    parser.add_argument("--offset", type=float, default=0.5, help="candidate X offset in cm")
+    parser.add_argument("--threshold", type=float, default=99.5, help="similarity threshold in percent")
+    parser.add_argument("--memory-budget-mb", type=float, default=sv.DEFAULT_MEMORY_BUDGET_MB)
+    parser.add_argument("--edge-loop-max-vertices", type=int, default=2000, help="edge loop search is quadratic; skip it above this size")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a JSON file written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a stage counts as a regression")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed peak memory growth before a stage counts as a regression")
+    args = parser.parse_args(argv)
+    args.stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+
+    # 基准测试只测计算本身，不走磁盘缓存和性能追踪
+    sv.disable_spatial_index_cache()
+    sv.profiler.enabled = False
+
+    results = {}
+    for size in args.sizes.split(","):
+        results.update(run_size(args.shape, parse_size(size), args))
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "scipy": scipy.__version__,
+                "machine": platform.machine(),
+                "results": results,
+            }, file, indent=2)
+        print(f"Results written to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare_with_baseline(results, baseline, args.tolerance, args.memory_tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
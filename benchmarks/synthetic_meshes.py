@@ -0,0 +1,51 @@
+"""
+Synthetic tube-grid meshes for the benchmarks: a sphere and a rough standing-body silhouette,
+both centred on the origin with Y up, in centimetres.
+"""
+import numpy as np
+
+# 身体轮廓：从脚(0)到头顶(1)的相对高度 -> 半径(cm)
+BODY_HEIGHT = 170.0
+BODY_PROFILE_HEIGHTS = [0.0, 0.04, 0.25, 0.48, 0.55, 0.72, 0.82, 0.86, 0.93, 1.0]
+BODY_PROFILE_RADII = [6.0, 9.0, 14.0, 26.0, 24.0, 27.0, 8.0, 9.0, 10.0, 1.0]
+
+
+def grid_shape(vertex_count):
+    """Rings and segments giving roughly vertex_count vertices with about 1.5 rings per segment"""
+    segments = max(8, int(round(np.sqrt(vertex_count / 1.5))))
+    rings = max(3, vertex_count // segments)
+    return rings, segments
+
+
+def sphere_points(rings, segments, radius=85.0):
+    theta = np.pi * (np.arange(rings) + 0.5) / rings
+    phi = 2 * np.pi * np.arange(segments) / segments
+    theta, phi = np.meshgrid(theta, phi, indexing='ij')
+    points = np.stack([radius * np.sin(theta) * np.cos(phi), -radius * np.cos(theta), radius * np.sin(theta) * np.sin(phi)], axis=-1)
+    return points.reshape(-1, 3)
+
+
+def body_points(rings, segments):
+    height = np.linspace(0.0, 1.0, rings)
+    phi = 2 * np.pi * np.arange(segments) / segments
+    height, phi = np.meshgrid(height, phi, indexing='ij')
+    radius = np.interp(height, BODY_PROFILE_HEIGHTS, BODY_PROFILE_RADII)
+    # 低频起伏，避免截面是完美的椭圆
+    radius = radius * (1 + 0.04 * np.sin(3 * phi) * np.sin(12 * height))
+    points = np.stack([radius * np.cos(phi), (height - 0.5) * BODY_HEIGHT, 0.7 * radius * np.sin(phi)], axis=-1)
+    return points.reshape(-1, 3)
+
+
+def make_mesh(shape, vertex_count):
+    rings, segments = grid_shape(vertex_count)
+    points = sphere_points(rings, segments) if shape == "sphere" else body_points(rings, segments)
+    return points, rings, segments
+
+
+def make_pair(shape, vertex_count, noise=0.2, offset=(0.0, 0.0, 0.0), seed=0):
+    """Reference and candidate of the same shape; the candidate has Gaussian noise (cm) and a rigid offset"""
+    reference, rings, segments = make_mesh(shape, vertex_count)
+    rng = np.random.default_rng(seed)
+    candidate = reference + rng.normal(0.0, noise, reference.shape) + np.asarray(offset)
+    # Maya 内部用单精度存储顶点
+    return reference.astype(np.float32).astype(np.float64), candidate.astype(np.float32).astype(np.float64), rings, segments